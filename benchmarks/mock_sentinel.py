@@ -0,0 +1,222 @@
+""" Copyright start
+  Copyright (C) 2008 - 2023 Fortinet Inc.
+  All rights reserved.
+  FORTINET CONFIDENTIAL & FORTINET PROPRIETARY SOURCE CODE
+  Copyright end """
+
+import json
+import os
+import random
+import re
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WORKSPACE_PREFIX = re.compile(r'^/subscriptions/[^/]+/resourceGroups/[^/]+/providers/Microsoft\.OperationalInsights/'
+                              r'workspaces/[^/]+/providers/Microsoft\.SecurityInsights')
+TOKEN_PATH = re.compile(r'^/[^/]+/oauth2/v2\.0/token$')
+QUERY_PATH = re.compile(r'^/subscriptions/[^/]+/resourceGroups/[^/]+/providers/Microsoft\.OperationalInsights/'
+                        r'workspaces/[^/]+/api/query$')
+COLLECTIONS = ('incidents', 'relations', 'comments', 'watchlists', 'watchlistItems', 'indicators')
+
+
+class MockSettings:
+
+    def __init__(self, latency=0.0, jitter=0.0, page_size=50, total_records=200, throttle_rate=0.0, seed=1,
+                 query_row_limit=5000, conflict_rate=0.0):
+        self.query_row_limit = query_row_limit
+        self.conflict_rate = conflict_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self.total_records = total_records
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+
+    def should_throttle(self):
+        with self.lock:
+            self.requests += 1
+            if self.throttle_rate and self.random.random() < self.throttle_rate:
+                self.throttled += 1
+                return True
+        return False
+
+
+def timestamp(index):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(1672531200 + index * 60))
+
+
+def make_record(collection, index):
+    name = '{0}-{1}'.format(collection[:-1] if collection.endswith('s') else collection, index)
+    properties = {'createdTimeUtc': timestamp(index), 'lastModifiedTimeUtc': timestamp(index)}
+    if collection == 'incidents':
+        properties.update({'title': 'Incident {0}'.format(index), 'severity': 'High', 'status': 'New',
+                           'incidentNumber': index, 'additionalData': {'alertsCount': 1, 'tactics': []}})
+    elif collection == 'indicators':
+        properties.update({'patternType': 'ipv4-addr', 'lastUpdatedTimeUtc': timestamp(index),
+                           'pattern': "[ipv4-addr:value = '10.{0}.{1}.{2}']".format(
+                               index // 65536 % 256, index // 256 % 256, index % 256)})
+    elif collection == 'watchlistItems':
+        properties.update({'itemsKeyValue': {'IP': '10.0.0.{0}'.format(index % 256), 'Index': str(index)}})
+    elif collection == 'watchlists':
+        properties.update({'displayName': name, 'itemsSearchKey': 'IP'})
+    elif collection == 'comments':
+        properties.update({'message': 'Comment {0}'.format(index)})
+    return {'id': '/mock/{0}/{1}'.format(collection, name), 'name': name, 'etag': '"{0}"'.format(index),
+            'properties': properties}
+
+
+class MockSentinelHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    settings = MockSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            return {}
+
+    def handle_request(self):
+        body = self.read_body()
+        settings = self.settings
+        if settings.latency or settings.jitter:
+            time.sleep(settings.latency + settings.random.uniform(0, settings.jitter))
+        if settings.should_throttle():
+            return self.send_json(429, {'error': {'code': 'TooManyRequests'}}, {'Retry-After': '1'})
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if TOKEN_PATH.match(url.path):
+            return self.send_json(200, {'access_token': 'mock-access-token', 'refresh_token': 'mock-refresh-token',
+                                        'expires_in': 3600, 'token_type': 'Bearer'})
+        if QUERY_PATH.match(url.path):
+            return self.send_json(200, self.query(body))
+        if url.path == '/batch':
+            return self.send_json(200, {'responses': [self.batch_response(request) for request in
+                                                      body.get('requests', [])]})
+        path = WORKSPACE_PREFIX.sub('', url.path)
+        if path == url.path:
+            return self.send_json(404, {'error': {'code': 'NotFound'}})
+        status, response = self.route(self.command, path, query, body)
+        if self.command == 'GET' and status == 200 and response.get('etag') and \
+                self.headers.get('If-None-Match') == response['etag']:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_json(status, response)
+
+    def batch_response(self, request):
+        if self.settings.should_throttle():
+            return {'name': request.get('name'), 'httpStatusCode': 429, 'headers': {'Retry-After': '1'},
+                    'content': {'error': {'code': 'TooManyRequests'}}}
+        url = urlparse(request.get('url', ''))
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        status, response = self.route(request.get('httpMethod', 'GET'), WORKSPACE_PREFIX.sub('', url.path), query,
+                                      request.get('content') or {})
+        return {'name': request.get('name'), 'httpStatusCode': status, 'headers': {}, 'content': response}
+
+    def route(self, method, path, query, body):
+        parts = [part for part in path.split('/') if part]
+        if parts[:2] == ['threatIntelligence', 'main']:
+            parts = parts[2:]
+        if not parts:
+            return 404, {'error': {'code': 'NotFound'}}
+        if parts[-1] in ('alerts', 'bookmarks') and method == 'POST':
+            return 200, {'value': [make_record(parts[-1], index) for index in range(3)]}
+        if parts[-1] == 'entities' and method == 'POST':
+            return 200, {'entities': [make_record('entities', index) for index in range(3)], 'metaData': []}
+        if parts[-1] in ('createIndicator', 'queryIndicators'):
+            return 200, make_record('indicators', 0) if parts[-1] == 'createIndicator' else self.page(
+                'indicators', query)
+        if parts[-1] in COLLECTIONS and method == 'GET':
+            return 200, self.page(parts[-1], query)
+        if len(parts) >= 2 and parts[-2] in COLLECTIONS:
+            if method == 'DELETE':
+                return 200, {}
+            record = make_record(parts[-2], 0)
+            record['name'] = parts[-1]
+            if method == 'PUT' and body.get('etag') and self.settings.random.random() < self.settings.conflict_rate:
+                return 412, {'error': {'code': 'PreconditionFailed', 'message': 'The etag does not match'}}
+            if method == 'PUT':
+                record['properties'].update(body.get('properties') or {})
+            return 200, record
+        return 404, {'error': {'code': 'NotFound'}}
+
+    def query(self, body):
+        # one row per minute of the requested timespan, like a query over a steady event stream
+        start, end = [datetime.fromisoformat(bound.replace('Z', '+00:00')) for bound in body['timespan'].split('/')]
+        first, last = int(start.timestamp()) // 60, int(end.timestamp()) // 60
+        columns = [{'name': 'TimeGenerated', 'type': 'datetime'}, {'name': 'Computer', 'type': 'string'},
+                   {'name': 'Count', 'type': 'long'}]
+        response = {'tables': [{'name': 'PrimaryResult', 'columns': columns, 'rows': []}]}
+        if last - first > self.settings.query_row_limit:
+            response['error'] = {'code': 'PartialError', 'details': [
+                {'code': 'EngineError', 'innererror': {'code': 'E_QUERY_RESULT_SET_TOO_LARGE'}}]}
+            last = first + self.settings.query_row_limit
+        response['tables'][0]['rows'] = [[timestamp(minute - 27922080), 'host-{0}'.format(minute % 7), minute % 100]
+                                         for minute in range(first, last)]
+        return response
+
+    def page(self, collection, query):
+        start = int(query.get('$skipToken') or 0)
+        top = int(query.get('$top') or self.settings.page_size)
+        end = min(start + top, self.settings.total_records)
+        response = {'value': [make_record(collection, index) for index in range(start, end)]}
+        if end < self.settings.total_records:
+            response['nextLink'] = 'https://{0}{1}?api-version=2022-11-01&$skipToken={2}'.format(
+                self.headers.get('Host'), urlparse(self.path).path, end)
+        return response
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = handle_request
+
+
+def self_signed_context():
+    directory = tempfile.mkdtemp(prefix='mock-sentinel-')
+    certfile, keyfile = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', keyfile, '-out', certfile,
+                    '-days', '1', '-subj', '/CN=localhost'], check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_server(settings, port=0):
+    handler = type('Handler', (MockSentinelHandler,), {'settings': settings})
+    server = MockServer(('127.0.0.1', port), handler)
+    # the handshake runs on the handler thread, so concurrent clients do not queue behind accept()
+    server.socket = self_signed_context().wrap_socket(server.socket, server_side=True, do_handshake_on_connect=False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,228 @@
+""" Copyright start
+  Copyright (C) 2008 - 2023 Fortinet Inc.
+  All rights reserved.
+  FORTINET CONFIDENTIAL & FORTINET PROPRIETARY SOURCE CODE
+  Copyright end """
+
+# Drives every entry of the connector's operations dict against a local stand-in for the token endpoint and the
+# Sentinel routes, and reports throughput, latency percentiles and peak traced memory per scenario.
+#
+# The FortiSOAR connector SDK (the connectors.core package) must be importable, e.g.:
+#   PYTHONPATH=/path/to/sdk python benchmarks/run_benchmarks.py --iterations 200 --latency 20 --throttle-rate 0.01
+
+import argparse
+import importlib
+import importlib.machinery
+import importlib.util
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+
+from mock_sentinel import MockSettings, start_server
+
+CONNECTOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'microsoft-sentinel')
+CONNECTOR_INFO = {'connector_name': 'microsoft-sentinel', 'connector_version': 'benchmark'}
+
+INDICATOR = {'patternType': 'IPV4 Address', 'pattern': '10.0.0.1', 'displayName': 'benchmark', 'source': 'benchmark',
+             'threatTypes': 'malicious-activity', 'confidence': 80}
+WATCHLIST = {'watchlistAlias': 'benchmark', 'displayName': 'benchmark', 'itemsSearchKey': 'IP', 'provider': 'benchmark',
+             'source': 'benchmark'}
+# parameters that select a different execution path of an operation, shown in the scenario label
+MODE_KEYS = ('fetch_all_pages', 'parallel_backfill', 'incremental_sync', 'multi_workspace', 'content_source',
+             'slice_hours')
+RECORDS = [{'IP': '10.0.0.{0}'.format(index), 'Index': str(index)} for index in range(20)]
+
+SCENARIOS = [
+    ('create_threat_intelligence_indicator', INDICATOR),
+    ('get_all_threat_intelligence_indicators', {'$top': 50}),
+    ('get_all_threat_intelligence_indicators', {'$top': 50, 'fetch_all_pages': True}),
+    ('get_threat_intelligence_indicator', {'id': 'indicator-1'}),
+    ('update_threat_intelligence_indicator', dict(INDICATOR, id='indicator-1')),
+    ('delete_threat_intelligence_indicator', {'id': 'indicator-1'}),
+    ('bulk_create_threat_intelligence_indicators', {'indicators': [INDICATOR] * 20}),
+    ('bulk_delete_threat_intelligence_indicators', {'ids': ['indicator-{0}'.format(index) for index in range(20)]}),
+    ('lookup_indicators', {'observables': ['10.0.0.1', '10.0.0.2', '192.0.2.1'], 'full_refresh': True}),
+    ('get_incident_list', {'$top': 50}),
+    ('get_incident_list', {'$top': 50, 'fetch_all_pages': True}),
+    ('get_incident_list', {'$top': 50, 'parallel_backfill': True, 'created_datetime': '2023-01-01T00:00:00Z',
+                           'created_datetime_end': '2023-01-02T00:00:00Z'}),
+    ('get_incident_list', {'$top': 50, 'incremental_sync': True, 'modified_since': '2023-01-01T00:00:00Z'}),
+    ('get_incident_list', {'$top': 50, 'multi_workspace': True, 'fetch_all_pages': True,
+                           'workspaces': ['subscription/group/workspace-{0}'.format(index) for index in range(8)]}),
+    ('get_incident', {'incidentId': 'incident-1'}),
+    ('update_incident', {'incidentId': 'incident-1', 'etag': '"1"', 'Status': 'Active'}),
+    ('bulk_update_incidents', {'incident_ids': ['incident-{0}'.format(index) for index in range(20)],
+                               'Status': 'Closed', 'classification': 'FalsePositive', 'reason': 'InaccurateData',
+                               'Comment': 'benchmark'}),
+    ('get_alert_list', {'incidentId': 'incident-1'}),
+    ('get_entities_list', {'incidentId': 'incident-1'}),
+    ('get_bookmarks_list', {'incidentId': 'incident-1'}),
+    ('fetch_incidents_for_ingestion', {'$top': 20}),
+    ('create_incident_relations', {'incidentId': 'incident-1', 'relationName': 'relation-1', 'resourceId': '/mock/1'}),
+    ('get_all_incident_relations', {'incidentId': 'incident-1'}),
+    ('get_incident_relations', {'incidentId': 'incident-1', 'relationName': 'relation-1'}),
+    ('update_incident_relations', {'incidentId': 'incident-1', 'relationName': 'relation-1', 'resourceId': '/mock/2'}),
+    ('delete_incident_relation', {'incidentId': 'incident-1', 'relationName': 'relation-1'}),
+    ('create_incident_comment', {'incidentId': 'incident-1', 'message': 'benchmark'}),
+    ('get_all_incident_comments', {'incidentId': 'incident-1'}),
+    ('get_incident_comment', {'incidentId': 'incident-1', 'incidentcommentId': 'comment-1'}),
+    ('update_incident_comment', {'incidentId': 'incident-1', 'incidentcommentId': 'comment-1', 'message': 'edit'}),
+    ('delete_incident_comment', {'incidentId': 'incident-1', 'incidentcommentId': 'comment-1'}),
+    ('get_incident_bundle', {'incidentId': 'incident-1'}),
+    ('create_watchlist', WATCHLIST),
+    ('create_watchlist', dict(WATCHLIST, content_source='Records', records=RECORDS)),
+    ('get_all_watchlist', {}),
+    ('get_watchlist', {'watchlistAlias': 'benchmark'}),
+    ('update_watchlist', WATCHLIST),
+    ('delete_watchlist', {'watchlistAlias': 'benchmark'}),
+    ('create_watchlist_item', {'watchlistAlias': 'benchmark', 'itemsKeyValue': RECORDS[0]}),
+    ('get_all_watchlist_items', {'watchlistAlias': 'benchmark'}),
+    ('get_all_watchlist_items', {'watchlistAlias': 'benchmark', 'fetch_all_pages': True}),
+    ('get_watchlist_item', {'watchlistAlias': 'benchmark', 'watchlistItemId': 'watchlistItem-1'}),
+    ('update_watchlist_item', {'watchlistAlias': 'benchmark', 'watchlistItemId': 'watchlistItem-1',
+                               'itemsKeyValue': RECORDS[1]}),
+    ('delete_watchlist_item', {'watchlistAlias': 'benchmark', 'watchlistItemId': 'watchlistItem-1'}),
+    ('bulk_upsert_watchlist_items', {'watchlistAlias': 'benchmark', 'items': RECORDS}),
+    ('bulk_delete_watchlist_items', {'watchlistAlias': 'benchmark',
+                                     'watchlistItemIds': ['watchlistItem-{0}'.format(index) for index in range(20)]}),
+    ('sync_watchlist', {'watchlistAlias': 'benchmark', 'records': RECORDS}),
+    ('run_kql_query', {'query': 'SecurityEvent | summarize count() by Computer, bin(TimeGenerated, 1m)',
+                       'start_time': '2023-01-01T00:00:00Z', 'end_time': '2023-01-08T00:00:00Z', 'slice_hours': 24}),
+    ('execute_batch', {'requests': [{'method': 'GET', 'path': 'incidents/incident-{0}'.format(index)}
+                                    for index in range(40)]}),
+    ('get_connector_metrics', {'output_format': 'Prometheus'}),
+]
+
+
+ROW = '{scenario:<56} {calls:>6} {errors:>6} {ops_per_second:>9} {p50_ms:>9} {p99_ms:>9} {peak_memory_kib:>10}'
+
+
+def load_operations():
+    spec = importlib.machinery.ModuleSpec('microsoft_sentinel', None, is_package=True)
+    spec.submodule_search_locations = [os.path.normpath(CONNECTOR_DIR)]
+    sys.modules['microsoft_sentinel'] = importlib.util.module_from_spec(spec)
+    return importlib.import_module('microsoft_sentinel.operations')
+
+
+def make_config(server, args):
+    return {
+        'config_id': 'benchmark',
+        'resource': 'https://127.0.0.1:{0}'.format(server.server_port),
+        'tenant_id': 'benchmark-tenant',
+        'client_id': 'benchmark-client',
+        'client_secret': 'benchmark-secret',
+        'verify_ssl': False,
+        'WorkspaceSubscriptionId': 'benchmark-subscription',
+        'WorkspaceResourceGroup': 'benchmark-group',
+        'WorkspaceName': 'benchmark-workspace',
+        'accessToken': 'benchmark-token',
+        'expiresOn': time.time() + 3600,
+        'refresh_token': 'benchmark-refresh-token',
+        # the bulk operations fan out to their own worker pool on top of the benchmark threads
+        'pool_size': args.concurrency * 8,
+        'rate_limit': args.rate_limit,
+        'cache_ttl': args.cache_ttl,
+        'stream_responses': args.stream,
+        'async_engine': args.async_engine,
+        'use_batch': args.batch
+    }
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))] if ordered else 0
+
+
+def run_scenario(operation, config, params, args):
+    latencies, errors = [], []
+
+    def call(_):
+        start = time.perf_counter()
+        try:
+            operation(dict(config), json.loads(json.dumps(params)), CONNECTOR_INFO)
+        except Exception as err:
+            errors.append(str(err))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(call, range(args.iterations)))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    call(None)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'calls': args.iterations,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'ops_per_second': round(args.iterations / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'peak_memory_kib': round(peak / 1024.0, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Microsoft Sentinel connector against a local mock.')
+    parser.add_argument('--iterations', type=int, default=50, help='calls per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='threads issuing calls per scenario')
+    parser.add_argument('--latency', type=float, default=0, help='mock server latency per request in ms')
+    parser.add_argument('--jitter', type=float, default=0, help='additional random mock latency in ms')
+    parser.add_argument('--page-size', type=int, default=50, help='records per page when $top is not given')
+    parser.add_argument('--total-records', type=int, default=200, help='records in every mock collection')
+    parser.add_argument('--throttle-rate', type=float, default=0, help='fraction of requests answered with 429')
+    parser.add_argument('--rate-limit', type=int, default=0, help='connector rate limit, 0 disables it')
+    parser.add_argument('--cache-ttl', type=int, default=0, help='connector response cache TTL in seconds')
+    parser.add_argument('--stream', action='store_true', help='enable streamed parsing of list responses')
+    parser.add_argument('--async-engine', action='store_true', help='send fan-out requests on the asynchronous engine')
+    parser.add_argument('--batch', action='store_true', help='combine fan-out requests into ARM batch requests')
+    parser.add_argument('--only', nargs='*', help='run only these operations')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    urllib3.disable_warnings()
+    operations = load_operations()
+    settings = MockSettings(latency=args.latency / 1000.0, jitter=args.jitter / 1000.0, page_size=args.page_size,
+                            total_records=args.total_records, throttle_rate=args.throttle_rate)
+    server = start_server(settings)
+    config = make_config(server, args)
+    auth = operations.get_client(config).auth
+    auth.token_url = 'https://127.0.0.1:{0}/{1}/oauth2/v2.0/token'.format(server.server_port, config['tenant_id'])
+    auth.refresh_token = config['refresh_token']
+
+    missing = sorted(set(operations.operations) - set(name for name, params in SCENARIOS))
+    results = []
+    print(ROW.format(scenario='scenario', calls='calls', errors='errors', ops_per_second='ops/s', p50_ms='p50 ms',
+                     p99_ms='p99 ms', peak_memory_kib='peak KiB'))
+    if not args.only or 'token_refresh' in args.only:
+        result = dict(run_scenario(lambda *arguments: auth.generate_token(True), config, {}, args),
+                      scenario='token_refresh')
+        results.append(result)
+        print(ROW.format(**result))
+    for name, params in SCENARIOS:
+        if args.only and name not in args.only:
+            continue
+        modes = [key for key in MODE_KEYS if key in params]
+        label = '{0}[{1}]'.format(name, ','.join(modes)) if modes else name
+        result = dict(run_scenario(operations.operations[name], config, params, args), scenario=label)
+        results.append(result)
+        print(ROW.format(**result))
+    server.shutdown()
+    print('mock requests: {0}, throttled: {1}'.format(settings.requests, settings.throttled))
+    if missing:
+        print('operations without a benchmark scenario: {0}'.format(', '.join(missing)))
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'settings': vars(args), 'results': results, 'missing': missing}, output, indent=2)
+    return 1 if missing or any(result['errors'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
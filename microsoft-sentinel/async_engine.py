@@ -0,0 +1,106 @@
+""" Copyright start
+  Copyright (C) 2008 - 2023 Fortinet Inc.
+  All rights reserved.
+  FORTINET CONFIDENTIAL & FORTINET PROPRIETARY SOURCE CODE
+  Copyright end """
+
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+
+try:
+    import aiohttp
+except ImportError:
+    # aiohttp is listed in requirements.txt; without it the async requests are run on a thread pool sized by the
+    # asynchronous concurrency
+    aiohttp = None
+
+
+class AsyncEngine:
+
+    def __init__(self):
+        self.loop = None
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.executor = None
+
+    @property
+    def http_available(self):
+        return aiohttp is not None
+
+    def start(self):
+        with self.lock:
+            if self.loop and self.loop.is_running():
+                return self.loop
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def serve():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+
+            threading.Thread(target=serve, name='microsoft-sentinel-async', daemon=True).start()
+            started.wait()
+            self.loop = loop
+            return loop
+
+    def run(self, coroutine):
+        # runs the coroutine on the engine's loop and blocks the calling thread until it completes; the
+        # coroutine sees the caller's context variables, so its requests count towards the calling operation
+        loop = self.start()
+        future = Future()
+
+        def done(task):
+            if task.cancelled():
+                future.cancel()
+            elif task.exception():
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def schedule():
+            if future.set_running_or_notify_cancel():
+                loop.create_task(coroutine).add_done_callback(done)
+
+        loop.call_soon_threadsafe(schedule, context=copy_context())
+        return future.result()
+
+    def to_thread(self, limit, func, *args, **kwargs):
+        # like asyncio.to_thread, on a pool of at least limit threads rather than the loop's default pool
+        with self.lock:
+            if not self.executor or self.executor._max_workers < limit:
+                if self.executor:
+                    self.executor.shutdown(wait=False)
+                self.executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix='microsoft-sentinel-async')
+            executor = self.executor
+        return asyncio.get_running_loop().run_in_executor(executor, partial(copy_context().run, func, *args,
+                                                                            **kwargs))
+
+    def session(self, key, fingerprint, verify_ssl, limit):
+        # must be called from a coroutine running on the engine's loop
+        entry = self.sessions.get(key)
+        if entry and entry[0] == fingerprint and not entry[1].closed:
+            return entry[1]
+        if entry:
+            self.loop.create_task(entry[1].close())
+        connector = aiohttp.TCPConnector(limit=limit, **({} if verify_ssl else {'ssl': False}))
+        session = aiohttp.ClientSession(connector=connector, headers={'Content-Type': 'application/json',
+                                                                      'consistencylevel': 'eventual'})
+        self.sessions[key] = (fingerprint, session)
+        return session
+
+
+async def gather_bounded(func, items, limit):
+    semaphore = asyncio.Semaphore(max(int(limit), 1))
+
+    async def bounded(item):
+        async with semaphore:
+            return await func(item)
+
+    return await asyncio.gather(*(bounded(item) for item in items))
+
+
+engine = AsyncEngine()
@@ -0,0 +1,77 @@
+""" Copyright start
+  Copyright (C) 2008 - 2023 Fortinet Inc.
+  All rights reserved.
+  FORTINET CONFIDENTIAL & FORTINET PROPRIETARY SOURCE CODE
+  Copyright end """
+
+import os
+import re
+from json import dumps, loads
+from time import time
+
+TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,128}$')
+
+
+class PaginationCheckpoint:
+    # the state file records how far a pagination run got; the records it has retrieved so far are appended to a
+    # spool file, and the state records the spool length that matches it
+
+    def __init__(self, directory, token):
+        if not TOKEN_PATTERN.match(token) or token.startswith('.'):
+            raise ValueError('The resume token may only contain letters, digits, ".", "_" and "-"')
+        self.token = token
+        self.directory = directory
+        self.path = os.path.join(directory, token + '.json')
+        self.spool_path = os.path.join(directory, token + '.jsonl')
+
+    def load(self):
+        try:
+            with open(self.path) as state_file:
+                return loads(state_file.read())
+        except (IOError, ValueError):
+            return None
+
+    def items(self, state):
+        # anything written after the last saved state belongs to an interrupted page and is discarded
+        if not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, 'r+b') as spool:
+            spool.truncate(state['spool_offset'])
+            spool.seek(0)
+            for line in spool:
+                yield loads(line)
+
+    def save(self, state, items):
+        with os.fdopen(os.open(self.spool_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600), 'ab') as spool:
+            for item in items:
+                spool.write(dumps(item).encode() + b'\n')
+            spool.flush()
+            os.fsync(spool.fileno())
+            state['spool_offset'] = spool.tell()
+        state['updated'] = time()
+        temporary = self.path + '.tmp'
+        with os.fdopen(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as state_file:
+            state_file.write(dumps(state))
+            state_file.flush()
+            os.fsync(state_file.fileno())
+        os.replace(temporary, self.path)
+
+    def remove(self):
+        for path in (self.path, self.spool_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def remove_expired(directory, max_age):
+    if not os.path.isdir(directory):
+        return
+    cutoff = time() - max_age
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
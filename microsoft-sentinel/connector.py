@@ -6,6 +6,8 @@
 
 from connectors.core.connector import Connector, get_logger, ConnectorError
 from .operations import operations, _check_health
+from .microsoft_api_auth import invalidate_token
+from .metrics import metrics
 from connectors.core.utils import update_connnector_config
 
 logger = get_logger('microsoft-sentinel')
@@ -18,11 +20,12 @@ class MicrosoftSentinel(Connector):
         try:
             connector_info = {"connector_name": self._info_json.get('name'),
                               "connector_version": self._info_json.get('version')}
-            operation = operations.get(operation)
+            operation_name, operation = operation, operations.get(operation)
         except Exception as err:
             logger.exception(err)
             raise ConnectorError(err)
-        return operation(config, params, connector_info)
+        with metrics.operation(operation_name, log=config.get('log_metrics')):
+            return operation(config, params, connector_info)
 
     def check_health(self, config):
         logger.info('starting health check')
@@ -40,6 +43,7 @@ class MicrosoftSentinel(Connector):
             new_auth_code = new_config.get('code')
             if old_auth_code != new_auth_code:
                 new_config.pop('access_token', '')
+                invalidate_token(new_config.get('config_id'))
             else:
                 new_config['access_token'] = old_config.get('access_token')
                 new_config['refresh_token'] = old_config.get('refresh_token ')
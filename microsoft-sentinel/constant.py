@@ -13,6 +13,9 @@ DEFAULT_REDIRECT_URL = 'https://localhost/myapp'
 AUTHORIZATION_CODE = 'authorization_code'
 REFRESH_TOKEN = 'refresh_token'
 
+# seconds before expiry at which a cached access token is renewed
+DEFAULT_TOKEN_REFRESH_SKEW = 300
+
 # endpoints
 THREAT_INDICATORS_API = "/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.OperationalInsights/workspaces/{2}/providers/Microsoft.SecurityInsights/threatIntelligence/main"
 INCIDENT_API = "/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.OperationalInsights/workspaces/{2}/providers/Microsoft.SecurityInsights/incidents"
@@ -20,6 +23,92 @@ INCIDENT_RELATION_API = "/subscriptions/{0}/resourceGroups/{1}/providers/Microso
 INCIDENT_COMMENT_API = "/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.OperationalInsights/workspaces/{2}/providers/Microsoft.SecurityInsights/incidents/{3}/comments"
 WATCHLIST_API = "/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.OperationalInsights/workspaces/{2}/providers/Microsoft.SecurityInsights/watchlists"
 WATCHLIST_ITEM_API = "/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.OperationalInsights/workspaces/{2}/providers/Microsoft.SecurityInsights/watchlists/{3}/watchlistItems"
+SECURITY_INSIGHTS_API = "/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.OperationalInsights/workspaces/{2}/providers/Microsoft.SecurityInsights"
+LOG_ANALYTICS_QUERY_API = "/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.OperationalInsights/workspaces/{2}/api/query?api-version=2020-08-01"
+
+WORKSPACE_APIS = [THREAT_INDICATORS_API, INCIDENT_API, INCIDENT_RELATION_API, INCIDENT_COMMENT_API, WATCHLIST_API,
+                  WATCHLIST_ITEM_API]
+
+# http connection pool
+DEFAULT_POOL_SIZE = 10
+
+# bytes read per chunk from a streamed response
+STREAM_CHUNK_SIZE = 65536
+
+# upper bound on records aggregated by a "fetch all pages" list operation
+DEFAULT_MAX_ITEMS = 10000
+
+# throttling: requests per second per subscription, and retries of throttled requests (backoff in seconds)
+DEFAULT_RATE_LIMIT = 20
+DEFAULT_MAX_RETRIES = 4
+RETRY_STATUS_CODES = [429, 503]
+# methods whose requests can be sent again without changing the result, when an earlier attempt may have
+# reached the server
+IDEMPOTENT_METHODS = ['GET', 'PUT', 'DELETE']
+RETRY_BACKOFF = 1
+RETRY_BACKOFF_MAX = 60
+RATE_LIMIT_LOW_WATERMARK = 10
+
+# conditional GET response cache: maximum age in seconds of an entry, which is revalidated on every use, and maximum
+# entries
+DEFAULT_CACHE_TTL = 60
+DEFAULT_CACHE_SIZE = 1000
+
+# concurrent retrieval
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_ASYNC_CONCURRENCY = 100
+DEFAULT_TIME_WINDOWS = 4
+DEFAULT_INCIDENT_ORDERBY = 'properties/createdTimeUtc asc'
+DEFAULT_WORKSPACE_CONCURRENCY = 8
+WORKSPACE_KEYS = ('WorkspaceSubscriptionId', 'WorkspaceResourceGroup', 'WorkspaceName')
+
+# incremental incident sync
+INCIDENT_SYNC_ORDERBY = 'properties/lastModifiedTimeUtc asc'
+DEFAULT_SYNC_CACHE_SIZE = 50000
+
+# incident properties sent back when an incident is updated from its current state, and the number of times an
+# update is retried against a freshly read incident after an etag conflict
+INCIDENT_WRITABLE_PROPERTIES = ['title', 'description', 'severity', 'status', 'classification',
+                                'classificationComment', 'classificationReason', 'owner', 'labels',
+                                'firstActivityTimeUtc', 'lastActivityTimeUtc']
+INCIDENT_CONFLICT_STATUS_CODES = [409, 412]
+DEFAULT_CONFLICT_RETRIES = 3
+
+# bulk operation retries, in seconds
+BULK_RETRY_BACKOFF = 1
+BULK_RETRY_BACKOFF_MAX = 30
+
+# maximum size in bytes of the rawContent CSV sent with a single watchlist request
+WATCHLIST_RAW_CONTENT_LIMIT = 3800000
+
+# Azure Resource Manager batch: sub-requests per call, and the workspace resources execute_batch accepts
+BATCH_API = "/batch?api-version=2020-06-01"
+BATCH_SIZE = 20
+BATCH_METHODS = ['GET', 'PUT', 'POST', 'DELETE']
+BATCH_RESOURCES = ['incidents', 'watchlists']
+
+# Log Analytics queries: the service's row limit per result, and the shortest slice in seconds that an oversized
+# result is split into
+QUERY_ROW_LIMIT = 500000
+QUERY_MIN_SLICE_SECONDS = 60
+
+# health check: seconds a healthy result is reused, and the latency in seconds above which a dependency is logged
+# as slow
+DEFAULT_HEALTH_CHECK_TTL = 60
+HEALTH_CHECK_SLOW_SECONDS = 5
+
+# list actions that are requested with POST but only read, so identical concurrent calls can share one request
+COALESCED_POST_ACTIONS = ['/alerts', '/entities', '/bookmarks']
+
+# local state kept by the connector, in a directory readable only by the connector's user
+DATA_DIR = '/tmp/microsoft-sentinel'
+
+# pagination checkpoints of fetch all pages runs, removed when a run completes or after this many seconds
+CHECKPOINT_MAX_AGE = 7 * 24 * 60 * 60
+
+# threat intelligence indicator mirror
+INDICATOR_MIRROR_ORDERBY = 'properties/lastUpdatedTimeUtc asc'
+INDICATOR_MIRROR_PAGE_SIZE = 100
 
 # pattern types
 
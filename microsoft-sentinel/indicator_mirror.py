@@ -0,0 +1,85 @@
+""" Copyright start
+  Copyright (C) 2008 - 2023 Fortinet Inc.
+  All rights reserved.
+  FORTINET CONFIDENTIAL & FORTINET PROPRIETARY SOURCE CODE
+  Copyright end """
+
+import re
+import threading
+from json import dumps, loads
+from .local_store import LOOKUP_BATCH_SIZE, SQLiteStore
+
+PATTERN_VALUE = re.compile(r"\[([\w-]+):[^=]*=\s*'((?:[^'\\]|\\.)*)'")
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS indicators (name TEXT PRIMARY KEY, pattern_type TEXT, value TEXT COLLATE NOCASE, "
+    "last_updated TEXT, indicator TEXT)",
+    "CREATE INDEX IF NOT EXISTS indicators_pattern ON indicators (value, pattern_type)",
+    "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)"
+]
+
+
+def parse_pattern(indicator):
+    properties = indicator.get('properties', {})
+    match = PATTERN_VALUE.search(properties.get('pattern') or '')
+    if not match:
+        return properties.get('patternType'), None
+    return properties.get('patternType') or match.group(1), match.group(2)
+
+
+class IndicatorMirror(SQLiteStore):
+    schema = SCHEMA
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        super().__init__(path)
+
+    def get_state(self, key):
+        with self.transaction() as connection:
+            row = connection.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key, value):
+        with self.lock, self.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)', (key, value))
+
+    def upsert(self, indicators):
+        rows = []
+        for indicator in indicators:
+            pattern_type, value = parse_pattern(indicator)
+            rows.append((indicator.get('name'), pattern_type, value,
+                         indicator.get('properties', {}).get('lastUpdatedTimeUtc'), dumps(indicator)))
+        with self.lock, self.transaction() as connection:
+            connection.executemany('INSERT OR REPLACE INTO indicators (name, pattern_type, value, last_updated, '
+                                   'indicator) VALUES (?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def remove(self, names):
+        with self.lock, self.transaction() as connection:
+            connection.executemany('DELETE FROM indicators WHERE name = ?', [(name,) for name in names])
+
+    def clear(self):
+        with self.lock, self.transaction() as connection:
+            connection.execute('DELETE FROM indicators')
+            connection.execute('DELETE FROM state')
+
+    def count(self):
+        with self.transaction() as connection:
+            return connection.execute('SELECT COUNT(*) FROM indicators').fetchone()[0]
+
+    def lookup(self, values, pattern_type=None):
+        matches = {}
+        values = list(values)
+        with self.transaction() as connection:
+            for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+                batch = values[start:start + LOOKUP_BATCH_SIZE]
+                query = 'SELECT value, indicator FROM indicators WHERE value IN ({0})'.format(
+                    ', '.join('?' * len(batch)))
+                arguments = list(batch)
+                if pattern_type:
+                    query += ' AND pattern_type = ?'
+                    arguments.append(pattern_type)
+                for value, indicator in connection.execute(query, arguments):
+                    matches.setdefault(value.lower(), []).append(loads(indicator))
+        return matches
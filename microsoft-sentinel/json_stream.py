@@ -0,0 +1,104 @@
+""" Copyright start
+  Copyright (C) 2008 - 2023 Fortinet Inc.
+  All rights reserved.
+  FORTINET CONFIDENTIAL & FORTINET PROPRIETARY SOURCE CODE
+  Copyright end """
+
+import codecs
+from json import JSONDecoder, JSONDecodeError
+
+_decoder = JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_NUMBER = set('0123456789+-.eE')
+
+# consumed text is dropped from the buffer once this many characters have been parsed
+_TRIM_THRESHOLD = 65536
+
+
+class JsonStream:
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        for chunk in self.chunks:
+            text = self.decoder.decode(chunk)
+            if text:
+                if self.pos > _TRIM_THRESHOLD:
+                    self.buffer = self.buffer[self.pos:]
+                    self.pos = 0
+                self.buffer += text
+                return True
+        self.buffer += self.decoder.decode(b'', final=True)
+        self.eof = True
+        return False
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise JSONDecodeError('Unexpected end of JSON document', self.buffer, self.pos)
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise JSONDecodeError('Expecting {0!r}'.format(char), self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self):
+        first = self.peek()
+        while True:
+            if first in '-0123456789' and not self.eof:
+                # a number is complete only once a character that cannot continue it has been read; raw_decode
+                # would accept a prefix such as 12. or 1e
+                end = self.pos
+                while end < len(self.buffer) and self.buffer[end] in _NUMBER:
+                    end += 1
+                if end == len(self.buffer):
+                    self.fill()
+                    continue
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # a value ending exactly at the buffer end may be a truncated number or literal
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+# yields the members of a top-level object as (key, value); elements of the stream_key array are yielded
+# one at a time as (stream_key, element), so the whole array is never held in memory
+def iter_members(chunks, stream_key='value'):
+    stream = JsonStream(chunks)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        key = stream.value()
+        stream.expect(':')
+        if key == stream_key and stream.peek() == '[':
+            stream.expect('[')
+            if stream.peek() != ']':
+                while True:
+                    yield key, stream.value()
+                    if stream.peek() != ',':
+                        break
+                    stream.expect(',')
+            stream.expect(']')
+        else:
+            yield key, stream.value()
+        if stream.peek() != ',':
+            break
+        stream.expect(',')
+    stream.expect('}')
@@ -0,0 +1,59 @@
+""" Copyright start
+  Copyright (C) 2008 - 2023 Fortinet Inc.
+  All rights reserved.
+  FORTINET CONFIDENTIAL & FORTINET PROPRIETARY SOURCE CODE
+  Copyright end """
+
+import os
+import sqlite3
+import stat
+from contextlib import contextmanager
+from connectors.core.connector import ConnectorError
+from .constant import DATA_DIR
+
+# sqlite limits the number of bound parameters per statement
+LOOKUP_BATCH_SIZE = 500
+
+
+def data_path(*parts):
+    # the local state holds incident and indicator data, so it is kept in a directory readable only by the
+    # connector's user, and a data directory that was created by another user, or that is a link, is not used
+    os.makedirs(DATA_DIR, mode=0o700, exist_ok=True)
+    status = os.lstat(DATA_DIR)
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid():
+        raise ConnectorError('The data directory {0} is not a directory owned by the connector user'.format(DATA_DIR))
+    if stat.S_IMODE(status.st_mode) != 0o700:
+        os.chmod(DATA_DIR, 0o700)
+    return os.path.join(DATA_DIR, *parts)
+
+
+def data_directory(*parts):
+    path = data_path(*parts)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    os.chmod(path, 0o700)
+    return path
+
+
+class SQLiteStore:
+    # a database under data_path, created readable only by the connector's user; sqlite creates its journal files
+    # with the same permissions
+
+    schema = []
+
+    def __init__(self, path):
+        self.path = path
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(path, 0o600)
+        with self.transaction() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            for statement in self.schema:
+                connection.execute(statement)
+
+    @contextmanager
+    def transaction(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
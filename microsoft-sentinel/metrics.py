@@ -0,0 +1,166 @@
+""" Copyright start
+  Copyright (C) 2008 - 2023 Fortinet Inc.
+  All rights reserved.
+  FORTINET CONFIDENTIAL & FORTINET PROPRIETARY SOURCE CODE
+  Copyright end """
+
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from json import dumps
+from time import time, perf_counter
+from connectors.core.connector import get_logger
+
+logger = get_logger('microsoft-sentinel')
+
+WORKSPACE_PATH = re.compile(r'/providers/Microsoft\.SecurityInsights/(?P<path>[^?]*)')
+WORKSPACE_API_PATH = re.compile(r'/workspaces/[^/]+/(?P<path>[^?]*)')
+
+# the operation record of the current execution; worker threads started through run_concurrently share it
+_current_operation = ContextVar('current_operation', default=None)
+
+TIMERS = ('token_seconds', 'http_seconds', 'decode_seconds')
+
+
+def endpoint_family(endpoint):
+    match = WORKSPACE_PATH.search(endpoint)
+    if not match and WORKSPACE_API_PATH.search(endpoint):
+        return WORKSPACE_API_PATH.search(endpoint).group('path')
+    if not match:
+        segments = [segment for segment in endpoint.split('?')[0].split('/') if segment]
+        return segments[0] if segments else '/'
+    # keep the collection names and drop the ids: incidents/{id}/comments/{id} -> incidents/comments
+    segments = [segment for segment in match.group('path').split('/') if segment]
+    return '/'.join(segments[::2]) or '/'
+
+
+def new_stats():
+    return dict({'requests': 0, 'coalesced': 0, 'response_bytes': 0, 'status_codes': {}},
+                **{timer: 0.0 for timer in TIMERS})
+
+
+class ConnectorMetrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.since = time()
+            self.operations = {}
+            self.endpoints = {}
+            self.token_refreshes = 0
+            self.token_refresh_seconds = 0.0
+
+    @contextmanager
+    def operation(self, name, log=False):
+        record = {'operation': name, 'started': perf_counter(), 'stats': new_stats()}
+        reset_token = _current_operation.set(record)
+        status = 'success'
+        try:
+            yield record
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            _current_operation.reset(reset_token)
+            record['status'] = status
+            record['wall_seconds'] = perf_counter() - record['started']
+            with self.lock:
+                stats = self.operations.setdefault(name, dict(new_stats(), calls=0, errors=0, wall_seconds=0.0))
+                stats['calls'] += 1
+                stats['errors'] += status == 'error'
+                stats['wall_seconds'] += record['wall_seconds']
+                self.merge(stats, record['stats'])
+            if log:
+                logger.info('operation metrics {0}'.format(dumps(log_record(record))))
+
+    def merge(self, stats, update):
+        stats['requests'] += update['requests']
+        stats['coalesced'] += update['coalesced']
+        stats['response_bytes'] += update['response_bytes']
+        for timer in TIMERS:
+            stats[timer] += update[timer]
+        for status_code, count in update['status_codes'].items():
+            stats['status_codes'][status_code] = stats['status_codes'].get(status_code, 0) + count
+
+    def record_request(self, endpoint, status_code=None, response_bytes=0, **timers):
+        update = new_stats()
+        update['requests'] = 1 if status_code is not None else 0
+        update['response_bytes'] = response_bytes
+        update.update({timer: timers.get(timer, 0.0) for timer in TIMERS})
+        if status_code is not None:
+            update['status_codes'] = {str(status_code): 1}
+        self.update(endpoint, update)
+
+    def update(self, endpoint, update):
+        family = endpoint_family(endpoint)
+        record = _current_operation.get()
+        with self.lock:
+            self.merge(self.endpoints.setdefault(family, new_stats()), update)
+            if record:
+                self.merge(record['stats'], update)
+
+    def record_coalesced(self, endpoint):
+        # a request that was answered by an identical request already in flight
+        self.update(endpoint, dict(new_stats(), coalesced=1))
+
+    def record_token_refresh(self, seconds=0.0):
+        # seconds is the time spent on the request to the token endpoint
+        record = _current_operation.get()
+        with self.lock:
+            self.token_refreshes += 1
+            self.token_refresh_seconds += seconds
+            if record:
+                record['token_refresh_seconds'] = record.get('token_refresh_seconds', 0.0) + seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'since': self.since,
+                'uptime_seconds': round(time() - self.since, 3),
+                'token_refreshes': self.token_refreshes,
+                'token_refresh_seconds': round(self.token_refresh_seconds, 6),
+                'operations': {name: rounded(stats) for name, stats in self.operations.items()},
+                'endpoints': {family: rounded(stats) for family, stats in self.endpoints.items()}
+            }
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = ['# TYPE sentinel_connector_token_refreshes_total counter',
+                 'sentinel_connector_token_refreshes_total {0}'.format(snapshot['token_refreshes']),
+                 '# TYPE sentinel_connector_token_refresh_seconds_total counter',
+                 'sentinel_connector_token_refresh_seconds_total {0}'.format(snapshot['token_refresh_seconds'])]
+        for kind, label in (('operations', 'operation'), ('endpoints', 'endpoint')):
+            stats = snapshot[kind]
+            counters = ['requests', 'coalesced', 'response_bytes'] + list(TIMERS)
+            if kind == 'operations':
+                counters = ['calls', 'errors', 'wall_seconds'] + counters
+            for counter in counters:
+                metric = 'sentinel_connector_{0}_{1}_total'.format(label, counter)
+                lines.append('# TYPE {0} counter'.format(metric))
+                for name, values in sorted(stats.items()):
+                    lines.append('{0}{{{1}="{2}"}} {3}'.format(metric, label, name, values[counter]))
+            metric = 'sentinel_connector_{0}_responses_total'.format(label)
+            lines.append('# TYPE {0} counter'.format(metric))
+            for name, values in sorted(stats.items()):
+                for status_code, count in sorted(values['status_codes'].items()):
+                    lines.append('{0}{{{1}="{2}",status_code="{3}"}} {4}'.format(metric, label, name, status_code,
+                                                                                  count))
+        return '\n'.join(lines) + '\n'
+
+
+def rounded(stats):
+    return {key: round(value, 6) if isinstance(value, float) else dict(value) if isinstance(value, dict) else value
+            for key, value in stats.items()}
+
+
+def log_record(record):
+    stats = rounded(record['stats'])
+    return dict(stats, operation=record['operation'], status=record['status'],
+                wall_seconds=round(record['wall_seconds'], 6))
+
+
+metrics = ConnectorMetrics()
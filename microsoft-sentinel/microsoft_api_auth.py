@@ -5,16 +5,30 @@
   Copyright end """
 
 from requests import request
-from time import time, ctime
-from datetime import datetime
+from time import perf_counter, time
+import threading
 from connectors.core.connector import get_logger, ConnectorError
 from .constant import *
+from .metrics import metrics
 from connectors.core.utils import update_connnector_config
 
 logger = get_logger('microsoft-sentinel')
 
 CONFIG_SUPPORTS_TOKEN = True
 
+_token_cache = {}
+_token_locks = {}
+_token_locks_guard = threading.Lock()
+
+
+def get_token_lock(config_id):
+    with _token_locks_guard:
+        return _token_locks.setdefault(config_id, threading.Lock())
+
+
+def invalidate_token(config_id):
+    _token_cache.pop(config_id, None)
+
 
 class MicrosoftAuth:
 
@@ -40,14 +54,25 @@ class MicrosoftAuth:
             self.redirect_url = DEFAULT_REDIRECT_URL
         else:
             self.redirect_url = config.get("redirect_uri")
+        self.refresh_skew = int(config.get("token_refresh_skew") or DEFAULT_TOKEN_REFRESH_SKEW)
+
+    def cached_token(self, connector_config):
+        cached = _token_cache.get(connector_config.get('config_id'))
+        if cached and float(cached['expiresOn'] or 0) >= float(connector_config.get('expiresOn') or 0):
+            return cached
+        token = {key: connector_config.get(key) for key in ('accessToken', 'expiresOn', 'refresh_token')}
+        if token['accessToken']:
+            _token_cache[connector_config.get('config_id')] = token
+        return token
 
-    def convert_ts_epoch(self, ts):
-        datetime_object = datetime.strptime(ctime(ts), "%a %b %d %H:%M:%S %Y")
-        return datetime_object.timestamp()
+    def needs_refresh(self, token):
+        return time() > float(token['expiresOn'] or 0) - self.refresh_skew
 
     def generate_token(self, REFRESH_TOKEN_FLAG):
         try:
+            started = perf_counter()
             resp = self.acquire_token_on_behalf_of_user(REFRESH_TOKEN_FLAG)
+            metrics.record_token_refresh(perf_counter() - started)
             ts_now = time()
             resp['expiresOn'] = (ts_now + resp['expires_in']) if resp.get("expires_in") else None
             resp['accessToken'] = resp.get("access_token")
@@ -59,28 +84,37 @@ class MicrosoftAuth:
 
     def validate_token(self, connector_config, connector_info):
         if CONFIG_SUPPORTS_TOKEN:
-            ts_now = time()
-            if not connector_config.get('accessToken'):
+            token = self.cached_token(connector_config)
+            if not token.get('accessToken'):
                 logger.error('Error occurred while connecting server: Unauthorized')
                 raise ConnectorError('Error occurred while connecting server: Unauthorized')
-            expires = connector_config['expiresOn']
-            expires_ts = self.convert_ts_epoch(expires)
-            if ts_now > float(expires_ts):
-                REFRESH_TOKEN_FLAG = True
-                logger.info("Token expired at {0}".format(expires))
-                self.refresh_token = connector_config["refresh_token"]
-                token_resp = self.generate_token(REFRESH_TOKEN_FLAG)
-                connector_config['accessToken'] = token_resp['accessToken']
-                connector_config['expiresOn'] = token_resp['expiresOn']
-                connector_config['refresh_token'] = token_resp.get('refresh_token')
-                update_connnector_config(connector_info['connector_name'], connector_info['connector_version'],
-                                         connector_config,
-                                         connector_config['config_id'])
-
-                return "Bearer {0}".format(connector_config.get('accessToken'))
+            if self.needs_refresh(token):
+                with get_token_lock(connector_config.get('config_id')):
+                    token = self.cached_token(connector_config)
+                    if self.needs_refresh(token):
+                        token = self.renew_token(token, connector_config, connector_info)
             else:
-                logger.info("Token is valid till {0}".format(expires))
-                return "Bearer {0}".format(connector_config.get('accessToken'))
+                logger.info("Token is valid till {0}".format(token['expiresOn']))
+            connector_config.update(token)
+            return "Bearer {0}".format(token['accessToken'])
+
+    def renew_token(self, token, connector_config, connector_info):
+        REFRESH_TOKEN_FLAG = True
+        logger.info("Token expires at {0}, refreshing".format(token['expiresOn']))
+        self.refresh_token = token['refresh_token']
+        token_resp = self.generate_token(REFRESH_TOKEN_FLAG)
+        renewed = {
+            'accessToken': token_resp['accessToken'],
+            'expiresOn': token_resp['expiresOn'],
+            'refresh_token': token_resp.get('refresh_token') or token['refresh_token']
+        }
+        _token_cache[connector_config.get('config_id')] = renewed
+        if renewed['accessToken'] != connector_config.get('accessToken'):
+            connector_config.update(renewed)
+            update_connnector_config(connector_info['connector_name'], connector_info['connector_version'],
+                                     connector_config,
+                                     connector_config['config_id'])
+        return renewed
 
     def acquire_token_on_behalf_of_user(self, REFRESH_TOKEN_FLAG):
         try:
@@ -131,6 +165,7 @@ def check(config, connector_info):
                 config['accessToken'] = token_resp.get('accessToken')
                 config['expiresOn'] = token_resp.get('expiresOn')
                 config['refresh_token'] = token_resp.get('refresh_token')
+                invalidate_token(config.get('config_id'))
                 update_connnector_config(connector_info['connector_name'], connector_info['connector_version'], config,
                                          config['config_id'])
                 return True
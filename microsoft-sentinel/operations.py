@@ -5,57 +5,427 @@
   Copyright end """
 
 from connectors.core.connector import get_logger, ConnectorError
+from connectors.cyops_utilities.builtins import download_file_from_cyops
+from integrations.crudhub import make_request
 import requests
+from urllib3.exceptions import NewConnectionError
 from .microsoft_api_auth import *
 from .constant import *
+from .json_stream import iter_members
+from .local_store import data_path, data_directory
+from .indicator_mirror import IndicatorMirror
+from .sync_state import IncidentSyncState
+from .checkpoints import PaginationCheckpoint, remove_expired
+from .metrics import metrics
+from .async_engine import engine, gather_bounded, aiohttp
+import asyncio
 import random, uuid
+import heapq
+import threading
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextvars import copy_context
+from itertools import islice
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from json import loads as json_loads, dumps as json_dumps
+from hashlib import sha1
+from time import time, monotonic, sleep, perf_counter
+from io import StringIO
+from math import ceil
+from urllib.parse import urlencode
+from requests.structures import CaseInsensitiveDict
+import csv
+import os
 
 logger = get_logger('microsoft-sentinel')
 
 
-def api_request(method, endpoint, connector_info, config, params=None, data=None, json=None, headers={}):
-    try:
-        ms = MicrosoftAuth(config)
-        endpoint = ms.host + endpoint
-        token = ms.validate_token(config, connector_info)
-        headers['Authorization'] = token
-        headers['Content-Type'] = 'application/json'
-        headers['consistencylevel'] = 'eventual'
-        response = request(method, endpoint, headers=headers, params=params, data=data, json=json,
-                           verify=ms.verify_ssl)
-        if response.status_code in [200, 201, 202, 204]:
-            if 'json' in str(response.headers):
-                return response.json()
+class SentinelClient:
+
+    def __init__(self, config):
+        self.auth = MicrosoftAuth(config)
+        self.host = self.auth.host
+        self.verify_ssl = self.auth.verify_ssl
+        self.fingerprint = client_fingerprint(config)
+        self.workspace = (config.get('WorkspaceSubscriptionId'),
+                          config.get('WorkspaceResourceGroup'),
+                          config.get('WorkspaceName'))
+        pool_size = int(config.get('pool_size') or DEFAULT_POOL_SIZE)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'consistencylevel': 'eventual',
+            'Connection': 'keep-alive'
+        })
+        self.endpoint_prefixes = {url: url.format(*self.workspace, '{3}') for url in WORKSPACE_APIS}
+        self.rate_limiter = get_rate_limiter(config)
+        cache_ttl = int(config.get('cache_ttl') if config.get('cache_ttl') is not None else DEFAULT_CACHE_TTL)
+        cache_size = int(config.get('cache_size') or DEFAULT_CACHE_SIZE)
+        self.response_cache = ResponseCache(cache_size, cache_ttl) if cache_ttl > 0 else None
+        self.max_retries = int(config.get('max_retries') if config.get('max_retries') is not None
+                               else DEFAULT_MAX_RETRIES)
+
+    def endpoint(self, url, id=None):
+        prefix = self.endpoint_prefixes.get(url)
+        if prefix is None:
+            prefix = self.endpoint_prefixes.setdefault(url, url.format(*self.workspace, '{3}'))
+        return prefix.replace('{3}', str(id)) if id else prefix
+
+    def request(self, method, endpoint, token, params=None, data=None, json=None, headers=None, stream=False):
+        request_headers = {'Authorization': token}
+        if headers:
+            request_headers.update(headers)
+        return self.session.request(method, self.host + endpoint, headers=request_headers, params=params, data=data,
+                                    json=json, verify=self.verify_ssl, stream=stream)
+
+    def close(self):
+        self.session.close()
+
+
+class ResponseCache:
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, response):
+        with self.lock:
+            self.entries[key] = {'response': response, 'etag': response.get('etag'), 'stored_at': monotonic()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def touch(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries[key]['stored_at'] = monotonic()
+
+    def is_fresh(self, entry):
+        return monotonic() - entry['stored_at'] < self.ttl
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class SingleFlight:
+    # concurrent calls with the same key wait for the call already in flight and share its result, returned with
+    # whether the call was coalesced; the result is copied only when it is shared, so that a caller modifying its
+    # response does not affect the others
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, func):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {'future': Future(), 'waiters': 0}
             else:
-                return dict()
-        elif response.status_code == 404:
-            return {"message": "Not Found"}
-        else:
-            raise ConnectorError("{0}".format(response.content))
+                call['waiters'] += 1
+        if not leader:
+            return deepcopy(call['future'].result()), True
+        try:
+            result = func()
+        except BaseException as err:
+            self.finish(key)
+            call['future'].set_exception(err)
+            raise
+        shared = self.finish(key)
+        call['future'].set_result(result)
+        return (deepcopy(result) if shared else result), False
+
+    def finish(self, key):
+        # no caller can join the call once it is removed, so the waiters counted here are all that share it
+        with self.lock:
+            return self.calls.pop(key)['waiters']
+
+
+_in_flight = SingleFlight()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def client_fingerprint(config):
+    return tuple(config.get(key) for key in ('resource', 'tenant_id', 'client_id', 'client_secret', 'code',
+                                             'redirect_uri', 'verify_ssl', 'pool_size', 'token_refresh_skew',
+                                             'rate_limit', 'rate_limit_burst', 'max_retries', 'cache_ttl', 'cache_size',
+                                             'WorkspaceSubscriptionId', 'WorkspaceResourceGroup',
+                                             'WorkspaceName'))
+
+
+def get_client(config):
+    config_id = config.get('config_id')
+    client = _clients.get(config_id)
+    if client and client.fingerprint == client_fingerprint(config):
+        return client
+    with _clients_lock:
+        client = _clients.get(config_id)
+        if not client or client.fingerprint != client_fingerprint(config):
+            if client:
+                client.close()
+            client = _clients[config_id] = SentinelClient(config)
+        return client
+
+
+class RequestError(ConnectorError):
+    # a failed request, with the status code of the response if there was one, and whether the request may have
+    # reached the server
+
+    def __init__(self, message, status_code=None, sent=True):
+        super().__init__(message)
+        self.status_code = status_code
+        self.sent = sent
+
+
+def is_transient(err, idempotent=True):
+    # a request that was never sent can always be retried; one that may have reached the server only if repeating
+    # it is safe and it did not fail with a client error
+    if not isinstance(err, RequestError):
+        return False
+    if not err.sent:
+        return True
+    return idempotent and (err.status_code is None or err.status_code >= 500)
+
+
+@contextmanager
+def request_errors():
+    try:
+        yield
+    except ConnectorError:
+        raise
     except requests.exceptions.SSLError:
         raise ConnectorError('SSL certificate validation failed')
     except requests.exceptions.ConnectTimeout:
-        raise ConnectorError('The request timed out while trying to connect to the server')
+        raise RequestError('The request timed out while trying to connect to the server', sent=False)
     except requests.exceptions.ReadTimeout:
-        raise ConnectorError(
+        raise RequestError(
             'The server did not send any data in the allotted amount of time')
-    except requests.exceptions.ConnectionError:
-        raise ConnectorError('Invalid Credentials')
+    except requests.exceptions.ConnectionError as err:
+        reason = getattr(err.args[0], 'reason', None) if err.args else None
+        raise RequestError('Invalid Credentials', sent=not isinstance(reason, NewConnectionError))
     except Exception as err:
         raise ConnectorError(str(err))
 
 
-def create_endpoint(config, url, id=None):
-    if id:
-        endpoint = url.format(config.get('WorkspaceSubscriptionId'),
-                              config.get('WorkspaceResourceGroup'),
-                              config.get('WorkspaceName'),
-                              id)
+def send_request(client, method, endpoint, connector_info, config, params=None, data=None, json=None, headers=None,
+                 stream=False):
+    attempt = 0
+    while True:
+        if client.rate_limiter:
+            client.rate_limiter.acquire()
+        started = perf_counter()
+        token = client.auth.validate_token(config, connector_info)
+        validated = perf_counter()
+        response = client.request(method, endpoint, token, params=params, data=data, json=json, headers=headers,
+                                  stream=stream)
+        metrics.record_request(endpoint, response.status_code, token_seconds=validated - started,
+                               http_seconds=perf_counter() - validated)
+        if client.rate_limiter:
+            client.rate_limiter.observe(response.headers)
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= client.max_retries:
+            break
+        response.close()
+        delay = retry_delay(response.headers, attempt)
+        logger.warning('Request throttled with status {0}, retrying in {1:.2f} seconds'.format(
+            response.status_code, delay))
+        if client.rate_limiter:
+            client.rate_limiter.pause(delay)
+        else:
+            sleep(delay)
+        attempt += 1
+    if method != 'GET' and client.response_cache:
+        client.response_cache.invalidate(endpoint)
+    return response
+
+
+def api_request(method, endpoint, connector_info, config, params=None, data=None, json=None, headers=None):
+    with request_errors():
+        client = get_client(config)
+        if not is_read_request(method, endpoint, data):
+            return client_request(client, method, endpoint, connector_info, config, params=params, data=data,
+                                  json=json, headers=headers)
+        # identical reads of the same credentials that are in flight at the same time share one request
+        key = (client.fingerprint, method, endpoint, json_dumps([params, json, headers], sort_keys=True, default=str))
+        result, coalesced = _in_flight.do(key, lambda: client_request(client, method, endpoint, connector_info, config,
+                                                                      params=params, json=json, headers=headers))
+        if coalesced:
+            metrics.record_coalesced(endpoint)
+        return result
+
+
+def is_read_request(method, endpoint, data=None):
+    if data is not None:
+        return False
+    if method == 'GET':
+        return True
+    return method == 'POST' and endpoint.split('?')[0].endswith(tuple(COALESCED_POST_ACTIONS))
+
+
+def client_request(client, method, endpoint, connector_info, config, params=None, data=None, json=None, headers=None):
+    response = send_request(client, method, endpoint, connector_info, config, params=params, data=data, json=json,
+                            headers=headers)
+    if response.status_code in [200, 201, 202, 204]:
+        if 'json' in str(response.headers):
+            started = perf_counter()
+            result = response.json()
+            metrics.record_request(endpoint, response_bytes=len(response.content),
+                                   decode_seconds=perf_counter() - started)
+            return result
+        else:
+            return dict()
+    elif response.status_code == 404:
+        return {"message": "Not Found"}
+    elif response.status_code == 304:
+        return {"message": "Not Modified"}
+    else:
+        raise RequestError("{0}".format(response.content), response.status_code)
+
+
+@contextmanager
+def async_request_errors():
+    try:
+        yield
+    except ConnectorError:
+        raise
+    except aiohttp.ClientSSLError:
+        raise ConnectorError('SSL certificate validation failed')
+    except aiohttp.ServerTimeoutError:
+        raise RequestError(
+            'The server did not send any data in the allotted amount of time')
+    except asyncio.TimeoutError:
+        raise RequestError('The request timed out while trying to connect to the server')
+    except aiohttp.ClientConnectorError:
+        raise RequestError('Invalid Credentials', sent=False)
+    except aiohttp.ClientConnectionError:
+        raise RequestError('Invalid Credentials')
+    except Exception as err:
+        raise ConnectorError(str(err))
+
+
+async def async_api_request(method, endpoint, connector_info, config, params=None, json=None, headers=None):
+    if not engine.http_available:
+        return await engine.to_thread(async_limit(config), api_request, method, endpoint, connector_info, config,
+                                      params=params, json=json, headers=headers)
+    with async_request_errors():
+        client = get_client(config)
+        session = engine.session(config.get('config_id'), (client.fingerprint, async_limit(config)),
+                                 client.verify_ssl, async_limit(config))
+        params = {key: str(value) for key, value in (params or {}).items() if value is not None}
+        attempt = 0
+        while True:
+            if client.rate_limiter:
+                await client.rate_limiter.acquire_async()
+            started = perf_counter()
+            if client.auth.needs_refresh(client.auth.cached_token(config)):
+                token = await asyncio.to_thread(client.auth.validate_token, config, connector_info)
+            else:
+                token = client.auth.validate_token(config, connector_info)
+            validated = perf_counter()
+            request_headers = {'Authorization': token}
+            if headers:
+                request_headers.update(headers)
+            async with session.request(method, client.host + endpoint, params=params, json=json,
+                                       headers=request_headers) as response:
+                content = await response.read()
+            metrics.record_request(endpoint, response.status, token_seconds=validated - started,
+                                   http_seconds=perf_counter() - validated)
+            if client.rate_limiter:
+                client.rate_limiter.observe(response.headers)
+            if response.status not in RETRY_STATUS_CODES or attempt >= client.max_retries:
+                break
+            delay = retry_delay(response.headers, attempt)
+            logger.warning('Request throttled with status {0}, retrying in {1:.2f} seconds'.format(
+                response.status, delay))
+            if client.rate_limiter:
+                client.rate_limiter.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+            attempt += 1
+        if method != 'GET' and client.response_cache:
+            client.response_cache.invalidate(endpoint)
+        if response.status in [200, 201, 202, 204]:
+            if 'json' in str(response.headers):
+                started = perf_counter()
+                result = json_loads(content)
+                metrics.record_request(endpoint, response_bytes=len(content), decode_seconds=perf_counter() - started)
+                return result
+            else:
+                return dict()
+        elif response.status == 404:
+            return {"message": "Not Found"}
+        elif response.status == 304:
+            return {"message": "Not Modified"}
+        else:
+            raise RequestError("{0}".format(content), response.status)
+
+
+def stream_request(method, endpoint, connector_info, config, params=None):
+    with request_errors():
+        client = get_client(config)
+        response = send_request(client, method, endpoint, connector_info, config, params=params, stream=True)
+        with closing(response):
+            if response.status_code == 200:
+                yield from iter_members(counted_chunks(endpoint, response.iter_content(STREAM_CHUNK_SIZE)))
+            elif response.status_code == 404:
+                yield 'message', 'Not Found'
+            else:
+                raise RequestError("{0}".format(response.content), response.status_code)
+
+
+def counted_chunks(endpoint, chunks):
+    received = 0
+    try:
+        for chunk in chunks:
+            received += len(chunk)
+            yield chunk
+    finally:
+        metrics.record_request(endpoint, response_bytes=received)
+
+
+def cached_request(endpoint, connector_info, config):
+    cache = get_client(config).response_cache
+    if not cache:
+        return api_request("GET", endpoint, connector_info, config, params={})
+    # a cached record is always revalidated with its etag, so changes made outside this process are seen; records
+    # older than the cache TTL are evicted and retrieved in full
+    entry = cache.get(endpoint)
+    if entry and not cache.is_fresh(entry):
+        cache.invalidate(endpoint)
+        entry = None
+    headers = {'If-None-Match': entry['etag']} if entry and entry['etag'] else None
+    response = api_request("GET", endpoint, connector_info, config, params={}, headers=headers)
+    if entry and response.get('message') == 'Not Modified':
+        cache.touch(endpoint)
+        return deepcopy(entry['response'])
+    if response.get('message'):
+        cache.invalidate(endpoint)
     else:
-        endpoint = url.format(config.get('WorkspaceSubscriptionId'),
-                              config.get('WorkspaceResourceGroup'),
-                              config.get('WorkspaceName'))
-    return endpoint
+        cache.put(endpoint, deepcopy(response))
+    return response
+
+
+def create_endpoint(config, url, id=None):
+    return get_client(config).endpoint(url, id)
 
 
 def check_payload(payload):
@@ -75,6 +445,557 @@ def extract_token(skip_token):
     return skip_token
 
 
+def iterate_pages(config, connector_info, endpoint, payload, max_pages=None):
+    payload = dict(payload)
+    pages = 0
+    while True:
+        if config.get('stream_responses'):
+            page = stream_page(endpoint, connector_info, config, payload)
+        else:
+            page = api_request("GET", endpoint, connector_info, config, params=payload)
+        pages += 1
+        yield page
+        next_link = page.get('nextLink')
+        if not next_link or (max_pages and pages >= max_pages):
+            return
+        payload['$skipToken'] = extract_token(next_link)
+
+
+def iterate_items(config, connector_info, endpoint, payload, max_items=None, max_pages=None):
+    if config.get('stream_responses'):
+        yield from stream_items(config, connector_info, endpoint, payload, max_items=max_items, max_pages=max_pages)
+        return
+    count = 0
+    for page in iterate_pages(config, connector_info, endpoint, payload, max_pages=max_pages):
+        for item in page.get('value', []):
+            yield item
+            count += 1
+            if max_items and count >= max_items:
+                return
+
+
+def stream_page(endpoint, connector_info, config, payload):
+    page = {'value': []}
+    for key, value in stream_request("GET", endpoint, connector_info, config, params=payload):
+        if key == 'value':
+            page['value'].append(value)
+        elif key == 'message':
+            return {'message': value}
+        else:
+            page[key] = value
+    return page
+
+
+def stream_items(config, connector_info, endpoint, payload, max_items=None, max_pages=None):
+    payload = dict(payload)
+    count = pages = 0
+    while True:
+        next_link = None
+        for key, value in stream_request("GET", endpoint, connector_info, config, params=payload):
+            if key == 'value':
+                yield value
+                count += 1
+                if max_items and count >= max_items:
+                    return
+            elif key == 'nextLink':
+                next_link = value
+        pages += 1
+        if not next_link or (max_pages and pages >= max_pages):
+            return
+        payload['$skipToken'] = extract_token(next_link)
+
+
+def collect_pages(pages, max_items=None):
+    result = {'value': []}
+    for page in pages:
+        if page.get('message'):
+            return page
+        result['value'].extend(page.get('value', []))
+        result['nextLink'] = page.get('nextLink')
+        if max_items and len(result['value']) >= max_items:
+            break
+    if not result.get('nextLink'):
+        result.pop('nextLink', None)
+    return result
+
+
+def list_request(config, params, connector_info, endpoint, payload):
+    if not params.get('fetch_all_pages'):
+        return api_request("GET", endpoint, connector_info, config, params=payload)
+    max_items = int(params.get('max_items') or DEFAULT_MAX_ITEMS)
+    max_pages = int(params.get('max_pages') or 0) or None
+    if params.get('resume_token'):
+        return checkpointed_pages(config, connector_info, endpoint, payload, params.get('resume_token'),
+                                  max_items=max_items, max_pages=max_pages)
+    return collect_pages(iterate_pages(config, connector_info, endpoint, payload, max_pages=max_pages),
+                         max_items=max_items)
+
+
+def checkpointed_pages(config, connector_info, endpoint, payload, resume_token, max_items=None, max_pages=None):
+    # every page is saved to disk before the next one is requested, so an interrupted run can be continued from
+    # where it stopped by running it again with the same resume token and parameters
+    directory = data_directory('checkpoints')
+    remove_expired(directory, CHECKPOINT_MAX_AGE)
+    token = str(resume_token)
+    try:
+        checkpoint = PaginationCheckpoint(directory, token)
+    except ValueError as err:
+        raise ConnectorError(str(err))
+    filter_hash = sha1(json_dumps([endpoint, payload], sort_keys=True).encode()).hexdigest()
+    state = checkpoint.load()
+    if state and state.get('filter_hash') != filter_hash:
+        raise ConnectorError('The resume token {0} belongs to a run with different parameters, use a new resume '
+                             'token or the parameters of the interrupted run'.format(token))
+    result = {'value': list(checkpoint.items(state)) if state else []}
+    if state:
+        logger.info('resuming {0} after {1} pages and {2} items'.format(token, state['pages'], state['items_emitted']))
+    else:
+        state = {'filter_hash': filter_hash, 'skip_token': payload.get('$skipToken'), 'next_link': None, 'pages': 0,
+                 'items_emitted': 0}
+    finished = state['pages'] and (not state['skip_token'] or (max_pages and state['pages'] >= max_pages) or
+                                   (max_items and state['items_emitted'] >= max_items))
+    pages = []
+    if not finished:
+        payload = dict(payload, **({'$skipToken': state['skip_token']} if state['skip_token'] else {}))
+        pages = iterate_pages(config, connector_info, endpoint, payload,
+                              max_pages=max_pages and max_pages - state['pages'])
+    try:
+        for page in pages:
+            if page.get('message'):
+                checkpoint.remove()
+                return page
+            items = page.get('value', [])
+            next_link = page.get('nextLink')
+            state.update(skip_token=extract_token(next_link) if next_link else None, next_link=next_link,
+                         pages=state['pages'] + 1, items_emitted=state['items_emitted'] + len(items))
+            checkpoint.save(state, items)
+            result['value'].extend(items)
+            if max_items and state['items_emitted'] >= max_items:
+                break
+    except Exception as err:
+        logger.exception('pagination interrupted after {0} pages: {1}'.format(state['pages'], err))
+        raise ConnectorError('{0}. Run the action again with the resume token {1} to continue from page {2}'.format(
+            err, token, state['pages'] + 1))
+    checkpoint.remove()
+    if state['next_link']:
+        result['nextLink'] = state['next_link']
+    return result
+
+
+def run_concurrently(func, items, max_workers=None):
+    return list(iter_concurrently(func, items, max_workers))
+
+
+# yields the results in the order of items as they become available, without holding on to consumed results
+def iter_concurrently(func, items, max_workers=None):
+    max_workers = min(int(max_workers or DEFAULT_MAX_WORKERS), len(items)) or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # each task runs in a copy of the caller's context so its requests count towards the calling operation
+        futures = [executor.submit(copy_context().run, func, item) for item in items]
+        for index in range(len(futures)):
+            result = futures[index].result()
+            futures[index] = None
+            yield result
+
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        # takes a token and returns 0, or returns the seconds to wait before trying again
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        while wait:
+            sleep(wait)
+            wait = self.reserve()
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.reserve()
+
+
+class RateLimiter(TokenBucket):
+
+    def __init__(self, rate, capacity=None):
+        super().__init__(rate, capacity)
+        self.resume_at = 0
+
+    def reserve(self):
+        wait = self.resume_at - monotonic()
+        if wait > 0:
+            return wait
+        return super().reserve()
+
+    def pause(self, seconds):
+        with self.lock:
+            self.resume_at = max(self.resume_at, monotonic() + seconds)
+            self.tokens = 0
+
+    def observe(self, headers):
+        for header, value in headers.items():
+            if header.lower().startswith('x-ms-ratelimit-remaining-') and str(value).isdigit() and \
+                    int(value) <= RATE_LIMIT_LOW_WATERMARK:
+                with self.lock:
+                    self.tokens = min(self.tokens, 0)
+                return
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(config):
+    rate = float(config.get('rate_limit') if config.get('rate_limit') is not None else DEFAULT_RATE_LIMIT)
+    if rate <= 0:
+        return None
+    burst = float(config.get('rate_limit_burst') or rate * 2)
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(config.get('WorkspaceSubscriptionId'))
+        if not limiter or (limiter.rate, limiter.capacity) != (rate, burst):
+            limiter = _rate_limiters[config.get('WorkspaceSubscriptionId')] = RateLimiter(rate, burst)
+        return limiter
+
+
+def retry_delay(headers, attempt):
+    retry_after = headers.get('Retry-After')
+    if retry_after:
+        if retry_after.isdigit():
+            return float(retry_after)
+        try:
+            return max((parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds(), 0)
+        except (TypeError, ValueError):
+            pass
+    backoff = min(RETRY_BACKOFF * 2 ** attempt, RETRY_BACKOFF_MAX)
+    return backoff + random.uniform(0, backoff)
+
+
+def bulk_outcome(item, result, retried):
+    if isinstance(result, dict) and result.get('message'):
+        return {'item': item, 'status': 'Failed', 'error': result.get('message'), 'retries': retried}
+    return {'item': item, 'status': 'Success', 'result': result, 'retries': retried}
+
+
+def bulk_backoff(retried):
+    return min(BULK_RETRY_BACKOFF * 2 ** (retried - 1), BULK_RETRY_BACKOFF_MAX)
+
+
+# only transient failures are retried; idempotent(item) tells whether the request of an item may be repeated after
+# an attempt that may have reached the server
+def run_bulk(func, items, max_workers=None, retries=0, idempotent=None):
+    start = time()
+
+    def attempt(item):
+        retried = 0
+        while True:
+            try:
+                return bulk_outcome(item, func(item), retried)
+            except ConnectorError as err:
+                if retried >= retries or not is_transient(err, idempotent(item) if idempotent else True):
+                    return {'item': item, 'status': 'Failed', 'error': str(err), 'retries': retried}
+                retried += 1
+                sleep(bulk_backoff(retried))
+            except Exception as err:
+                return {'item': item, 'status': 'Failed', 'error': str(err), 'retries': retried}
+
+    return bulk_summary(run_concurrently(attempt, items, max_workers), start)
+
+
+def bulk_summary(results, start):
+    elapsed = time() - start
+    succeeded = sum(1 for result in results if result['status'] == 'Success')
+    summary = {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'retried': sum(1 for result in results if result['retries']),
+        'elapsed_seconds': round(elapsed, 3),
+        'items_per_second': round(len(results) / elapsed, 2) if elapsed else len(results)
+    }
+    return {'results': results, 'summary': summary}
+
+
+def async_limit(config):
+    return int(config.get('async_concurrency') or DEFAULT_ASYNC_CONCURRENCY)
+
+
+def send_spec(spec, connector_info, config):
+    return api_request(spec['method'], spec['endpoint'], connector_info, config, params=spec.get('params'),
+                       json=spec.get('json'))
+
+
+async def send_spec_async(spec, connector_info, config):
+    return await async_api_request(spec['method'], spec['endpoint'], connector_info, config,
+                                   params=spec.get('params'), json=spec.get('json'))
+
+
+def batch_url(client, spec):
+    params = {key: value for key, value in (spec.get('params') or {}).items() if value is not None}
+    url = client.host + spec['endpoint']
+    if params:
+        url += ('&' if '?' in url else '?') + urlencode(params)
+    return url
+
+
+def send_batch(config, connector_info, specs):
+    # one ARM batch round trip; returns the sub-responses in the order of specs
+    client = get_client(config)
+    batch = []
+    for index, spec in enumerate(specs):
+        request = {'name': str(index), 'httpMethod': spec['method'], 'url': batch_url(client, spec)}
+        if spec.get('json') is not None and spec['method'] != 'GET':
+            request['content'] = spec['json']
+        batch.append(request)
+    with request_errors():
+        response = send_request(client, 'POST', BATCH_API, connector_info, config, json={'requests': batch})
+        # a batch that does not complete in time is answered with 202 and a Location to poll for the result
+        while response.status_code == 202 and response.headers.get('Location'):
+            sleep(float(response.headers.get('Retry-After') or 1))
+            location = response.headers['Location']
+            response = send_request(client, 'GET', location[len(client.host):] if location.startswith(
+                client.host) else location, connector_info, config)
+        if response.status_code != 200:
+            raise RequestError("{0}".format(response.content), response.status_code)
+        responses = {sub.get('name'): sub for sub in response.json().get('responses', [])}
+    results = []
+    for index, spec in enumerate(specs):
+        sub = responses.get(str(index)) or {'error': 'No response was returned for the batched request'}
+        metrics.record_request(spec['endpoint'], sub.get('httpStatusCode'))
+        if spec['method'] != 'GET' and client.response_cache:
+            client.response_cache.invalidate(spec['endpoint'])
+        results.append(sub)
+    return results
+
+
+# sends the specs as ARM batch requests of up to BATCH_SIZE sub-requests, concurrently, and returns one
+# sub-response per spec; throttled sub-requests are sent again in a later batch
+def batch_requests(config, connector_info, specs, max_workers=None):
+    client = get_client(config)
+    results = [None] * len(specs)
+    pending = list(range(len(specs)))
+    attempt = 0
+
+    def send(chunk):
+        try:
+            return send_batch(config, connector_info, [specs[index] for index in chunk])
+        except ConnectorError as err:
+            return [{'error': str(err), 'exception': err}] * len(chunk)
+
+    while pending:
+        chunks = [pending[start:start + BATCH_SIZE] for start in range(0, len(pending), BATCH_SIZE)]
+        throttled, delay = [], 0
+        for chunk, responses in zip(chunks, run_concurrently(send, chunks, max_workers)):
+            for index, sub in zip(chunk, responses):
+                if sub.get('httpStatusCode') in RETRY_STATUS_CODES and attempt < client.max_retries:
+                    throttled.append(index)
+                    delay = max(delay, retry_delay(CaseInsensitiveDict(sub.get('headers') or {}), attempt))
+                else:
+                    results[index] = sub
+        pending = throttled
+        if pending:
+            logger.warning('{0} batched requests throttled, retrying in {1:.2f} seconds'.format(len(pending), delay))
+            sleep(delay)
+            attempt += 1
+    return results
+
+
+def batch_result(sub):
+    if sub.get('exception'):
+        raise sub['exception']
+    status_code = sub.get('httpStatusCode')
+    content = sub.get('content')
+    if status_code in [200, 201, 202, 204]:
+        return content if isinstance(content, dict) else dict()
+    elif status_code == 404:
+        return {"message": "Not Found"}
+    elif status_code == 304:
+        return {"message": "Not Modified"}
+    else:
+        raise RequestError("{0}".format(json_dumps(content) if content else sub.get('error') or status_code),
+                           status_code)
+
+
+def returned_error(func, *args):
+    try:
+        return func(*args)
+    except ConnectorError as err:
+        return err
+
+
+# sends one request per item, built by build(item) as {'method', 'endpoint', 'params', 'json'}, on worker threads,
+# combined into ARM batch requests, or as coroutines on the asynchronous engine's event loop; with return_errors,
+# a failed request returns its ConnectorError in place of the result instead of raising it
+def fan_out_requests(config, connector_info, items, build, max_workers=None, return_errors=False):
+    if config.get('use_batch'):
+        subs = batch_requests(config, connector_info, [build(item) for item in items], max_workers)
+        return [returned_error(batch_result, sub) if return_errors else batch_result(sub) for sub in subs]
+    if not config.get('async_engine'):
+        def send_item(item):
+            return send_spec(build(item), connector_info, config)
+
+        return run_concurrently(lambda item: returned_error(send_item, item) if return_errors else send_item(item),
+                                items, max_workers)
+
+    async def send(item):
+        try:
+            return await send_spec_async(build(item), connector_info, config)
+        except ConnectorError as err:
+            if not return_errors:
+                raise
+            return err
+
+    return engine.run(gather_bounded(send, items, async_limit(config)))
+
+
+# run_bulk for operations that send exactly one request per item; throttle is an optional TokenBucket. The
+# requests are built once, so that a retried item sends the same request again, and an item whose request cannot
+# be built fails on its own
+def run_bulk_requests(config, connector_info, items, build, max_workers=None, retries=0, throttle=None):
+    start = time()
+    outcomes, specs = [None] * len(items), {}
+    for index, item in enumerate(items):
+        try:
+            specs[index] = build(item)
+        except Exception as err:
+            outcomes[index] = {'item': item, 'status': 'Failed', 'error': str(err), 'retries': 0}
+    indexes = list(specs)
+    if config.get('use_batch'):
+        sent = run_bulk_batched(config, connector_info, indexes, specs, max_workers, retries, throttle)
+    elif not config.get('async_engine'):
+        def send(index):
+            if throttle:
+                throttle.acquire()
+            return send_spec(specs[index], connector_info, config)
+
+        sent = run_bulk(send, indexes, max_workers, retries,
+                        idempotent=lambda index: specs[index]['method'] in IDEMPOTENT_METHODS)['results']
+    else:
+        async def attempt(index):
+            retried = 0
+            while True:
+                try:
+                    if throttle:
+                        await throttle.acquire_async()
+                    return bulk_outcome(index, await send_spec_async(specs[index], connector_info, config), retried)
+                except ConnectorError as err:
+                    if retried >= retries or not is_transient(err, specs[index]['method'] in IDEMPOTENT_METHODS):
+                        return {'item': index, 'status': 'Failed', 'error': str(err), 'retries': retried}
+                    retried += 1
+                    await asyncio.sleep(bulk_backoff(retried))
+                except Exception as err:
+                    return {'item': index, 'status': 'Failed', 'error': str(err), 'retries': retried}
+
+        sent = engine.run(gather_bounded(attempt, indexes, async_limit(config)))
+    for outcome in sent:
+        index = outcome['item']
+        outcome['item'] = items[index]
+        outcomes[index] = outcome
+    return bulk_summary(outcomes, start)
+
+
+# returns the outcomes of the requests specs[index] for each of indexes, with the index as the item
+def run_bulk_batched(config, connector_info, indexes, specs, max_workers=None, retries=0, throttle=None):
+    outcomes = {}
+    retried = dict.fromkeys(indexes, 0)
+    pending = list(indexes)
+    while pending:
+        if throttle:
+            for index in pending:
+                throttle.acquire()
+        failed = []
+        for index, sub in zip(pending, batch_requests(config, connector_info, [specs[index] for index in pending],
+                                                      max_workers)):
+            try:
+                outcomes[index] = bulk_outcome(index, batch_result(sub), retried[index])
+            except ConnectorError as err:
+                if retried[index] >= retries or not is_transient(err, specs[index]['method'] in IDEMPOTENT_METHODS):
+                    outcomes[index] = {'item': index, 'status': 'Failed', 'error': str(err),
+                                       'retries': retried[index]}
+                else:
+                    retried[index] += 1
+                    failed.append(index)
+        pending = failed
+        if pending:
+            sleep(bulk_backoff(max(retried[index] for index in pending)))
+    return [outcomes[index] for index in indexes]
+
+
+def parse_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            return json_loads(value)
+        return [item.strip() for item in value.split(',') if item.strip()]
+    return value if isinstance(value, list) else [value]
+
+
+def parse_datetime(value):
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc)
+    date_time = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if not date_time.tzinfo:
+        date_time = date_time.replace(tzinfo=timezone.utc)
+    return date_time
+
+
+def format_datetime(date_time):
+    return date_time.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def split_time_range(start, end, windows):
+    step = (end - start) / windows
+    bounds = [start + step * i for i in range(windows)] + [end]
+    return [(format_datetime(bounds[i]), format_datetime(bounds[i + 1])) for i in range(windows)]
+
+
+def orderby_key(orderby):
+    field, _, direction = orderby.split(',')[0].strip().partition(' ')
+    path = field.split('/')
+
+    def key(record):
+        value = record
+        for part in path:
+            value = value.get(part) if isinstance(value, dict) else None
+        return (value is not None, value if value is not None else '')
+
+    return key, direction.strip().lower() == 'desc'
+
+
+def merge_ordered(record_lists, orderby):
+    key, reverse = orderby_key(orderby)
+    seen = set()
+    for record in heapq.merge(*record_lists, key=key, reverse=reverse):
+        name = record.get('name')
+        if name in seen:
+            continue
+        seen.add(name)
+        yield record
+
+
+def list_value(value):
+    if not value:
+        return ""
+    return value if isinstance(value, list) else value.split(",")
+
+
 def threat_indicator_payload(params):
     threatIntelligenceTags = params.get('threatIntelligenceTags')
     threatTypes = params.get('threatTypes')
@@ -87,10 +1008,10 @@ def threat_indicator_payload(params):
             'confidence': params.get('confidence'),
             'description': params.get('description'),
             'displayName': params.get('displayName'),
-            'threatIntelligenceTags': threatIntelligenceTags.split(",") if threatIntelligenceTags else "",
-            'threatTypes': threatTypes.split(",") if threatTypes else "",
-            'indicatorTypes': indicatorTypes.split(",") if indicatorTypes else "",
-            'labels': labels.split(",") if labels else "",
+            'threatIntelligenceTags': list_value(threatIntelligenceTags),
+            'threatTypes': list_value(threatTypes),
+            'indicatorTypes': list_value(indicatorTypes),
+            'labels': list_value(labels),
             'patternType': pattern_type,
             'pattern': "[{0}:value = '{1}']".format(pattern_type, params.get('pattern')),
             'source': params.get('source')
@@ -111,6 +1032,45 @@ def create_threat_intelligence_indicator(config, params, connector_info):
     return response
 
 
+def bulk_create_threat_intelligence_indicators(config, params, connector_info):
+    url = THREAT_INDICATORS_API + "/createIndicator?api-version=2022-11-01"
+    endpoint = create_endpoint(config, url)
+    indicators = parse_list(params.get('indicators'))
+
+    def create(indicator):
+        if not isinstance(indicator, dict):
+            raise ConnectorError('Each indicator must be an object: {0}'.format(indicator))
+        return {'method': 'POST', 'endpoint': endpoint, 'json': threat_indicator_payload(indicator)}
+
+    return run_bulk_requests(config, connector_info, indicators, create, params.get('max_workers'),
+                             retries=int(params.get('retries') or 0), throttle=throughput_cap(params))
+
+
+def bulk_delete_threat_intelligence_indicators(config, params, connector_info):
+    indicator_ids = parse_list(params.get('ids'))
+    url = THREAT_INDICATORS_API + "/indicators/{3}?api-version=2022-11-01"
+
+    def delete(indicator_id):
+        return {'method': 'DELETE', 'endpoint': create_endpoint(config, url, id=indicator_id), 'params': {}}
+
+    result = run_bulk_requests(config, connector_info, indicator_ids, delete, params.get('max_workers'),
+                               retries=int(params.get('retries') or 0), throttle=throughput_cap(params))
+    mirror = get_indicator_mirror(config, create=False)
+    if mirror:
+        # an indicator whose delete failed is still in the workspace, and an incremental refresh would not return it
+        mirror.remove([outcome['item'] for outcome in result['results']
+                       if outcome['status'] == 'Success' or outcome.get('error') == 'Not Found'])
+    for outcome in result['results']:
+        if outcome['status'] == 'Success':
+            outcome['result'] = {"result": "Successfully deleted the indicator {0}".format(outcome['item'])}
+    return result
+
+
+def throughput_cap(params):
+    rate = params.get('max_rate')
+    return TokenBucket(rate) if rate else None
+
+
 def get_all_threat_intelligence_indicators(config, params, connector_info):
     url = THREAT_INDICATORS_API + "/indicators?api-version=2022-11-01"
     endpoint = create_endpoint(config, url)
@@ -126,14 +1086,14 @@ def get_all_threat_intelligence_indicators(config, params, connector_info):
         '$skipToken': skip_token
     }
     payload = {k: v for k, v in payload.items() if v is not None and v != ''}
-    response = api_request("GET", endpoint, connector_info, config, params=payload)
+    response = list_request(config, params, connector_info, endpoint, payload)
     return response
 
 
 def get_threat_intelligence_indicator(config, params, connector_info):
     url = THREAT_INDICATORS_API + "/indicators/{3}?api-version=2022-11-01"
     endpoint = create_endpoint(config, url, id=params.get('id'))
-    response = api_request("GET", endpoint, connector_info, config, params={})
+    response = cached_request(endpoint, connector_info, config)
     return response
 
 
@@ -149,17 +1109,91 @@ def delete_threat_intelligence_indicator(config, params, connector_info):
     url = THREAT_INDICATORS_API + "/indicators/{3}?api-version=2022-11-01"
     endpoint = create_endpoint(config, url, id=params.get('id'))
     response = api_request("DELETE", endpoint, connector_info, config, params={})
+    mirror = get_indicator_mirror(config, create=False)
+    if mirror:
+        mirror.remove([params.get('id')])
     if response.get('message'):
         return response
     else:
         return {"result": "Successfully deleted the indicator {0}".format(params.get("id"))}
 
 
-def get_incident_list(config, params, connector_info):
+# the local databases of a configuration are named after its workspace, so that a configuration that is pointed at
+# another workspace starts with empty ones
+def workspace_data_path(config, name):
+    workspace = [config.get('resource')] + [config.get(key) for key in WORKSPACE_KEYS]
+    digest = sha1(json_dumps(workspace).encode()).hexdigest()[:12]
+    return data_path('{0}-{1}-{2}'.format(config.get('config_id'), digest, name))
+
+
+_indicator_mirrors = {}
+_indicator_mirrors_lock = threading.Lock()
+
+
+def get_indicator_mirror(config, create=True):
+    path = workspace_data_path(config, 'indicators.db')
+    with _indicator_mirrors_lock:
+        mirror = _indicator_mirrors.get(path)
+        if not mirror and (create or os.path.exists(path)):
+            mirror = _indicator_mirrors[path] = IndicatorMirror(path)
+        return mirror
+
+
+def refresh_indicator_mirror(config, connector_info, full_refresh=False):
+    mirror = get_indicator_mirror(config)
+    with mirror.refresh_lock:
+        if full_refresh:
+            mirror.clear()
+        high_water_mark = mirror.get_state('high_water_mark')
+        url = THREAT_INDICATORS_API + "/indicators?api-version=2022-11-01"
+        endpoint = create_endpoint(config, url)
+        payload = {'$orderby': INDICATOR_MIRROR_ORDERBY, '$top': INDICATOR_MIRROR_PAGE_SIZE}
+        if high_water_mark:
+            payload['$filter'] = 'properties/lastUpdatedTimeUtc ge ' + high_water_mark
+        batch, refreshed = [], 0
+        for indicator in iterate_items(config, connector_info, endpoint, payload):
+            batch.append(indicator)
+            last_updated = indicator.get('properties', {}).get('lastUpdatedTimeUtc')
+            if last_updated and (not high_water_mark or last_updated > high_water_mark):
+                high_water_mark = last_updated
+            if len(batch) >= INDICATOR_MIRROR_PAGE_SIZE:
+                refreshed += mirror.upsert(batch)
+                batch = []
+        refreshed += mirror.upsert(batch)
+        if high_water_mark:
+            mirror.set_state('high_water_mark', high_water_mark)
+    return refreshed, high_water_mark
+
+
+def lookup_indicators(config, params, connector_info):
+    refreshed, high_water_mark = 0, None
+    if params.get('refresh_mirror', True) or params.get('full_refresh'):
+        refreshed, high_water_mark = refresh_indicator_mirror(config, connector_info, params.get('full_refresh'))
+    mirror = get_indicator_mirror(config)
+    observables = [str(observable).strip() for observable in parse_list(params.get('observables'))]
+    pattern_type = PATTERN_TYPE.get(params.get('patternType'), params.get('patternType'))
+    matches = mirror.lookup(observables, pattern_type)
+    found, not_found = [], []
+    for observable in observables:
+        indicators = matches.get(observable.lower())
+        if indicators:
+            found.append({'observable': observable, 'indicators': indicators})
+        else:
+            not_found.append(observable)
+    return {
+        'found': found,
+        'not_found': not_found,
+        'mirror': {
+            'indicators': mirror.count(),
+            'refreshed': refreshed,
+            'high_water_mark': high_water_mark or mirror.get_state('high_water_mark')
+        }
+    }
+
+
+def incident_list_payload(params, created_from=None, created_to=None, modified_from=None):
     filter_list = []
-    url = INCIDENT_API + "?api-version=2022-11-01"
-    endpoint = create_endpoint(config, url)
-    date_time = params.get('created_datetime')
+    date_time = created_from or params.get('created_datetime')
     filter = params.get('$filter')
     filter_params = {
         'createdTimeUtc': date_time,
@@ -174,6 +1208,10 @@ def get_incident_list(config, params, connector_info):
             filter_list.append('properties/' + item + ' eq ' + f"'{value}'")
         else:
             filter_list.append('properties/' + item + ' eq ' + f"'{value}'")
+    if created_to:
+        filter_list.append('properties/createdTimeUtc lt ' + created_to)
+    if modified_from:
+        filter_list.append('properties/lastModifiedTimeUtc ge ' + modified_from)
     if filter:
         filter_list.append(filter)
     filter_str = ' and '.join(filter_list)
@@ -188,14 +1226,147 @@ def get_incident_list(config, params, connector_info):
         '$skipToken': skip_token
     }
     payload = check_payload(payload)
-    response = api_request("GET", endpoint, connector_info, config, params=payload)
+    return payload
+
+
+def get_incident_list(config, params, connector_info):
+    url = INCIDENT_API + "?api-version=2022-11-01"
+    if params.get('multi_workspace'):
+        return get_incident_list_across_workspaces(config, params, connector_info, url)
+    endpoint = create_endpoint(config, url)
+    if params.get('parallel_backfill'):
+        return get_incident_list_by_time_windows(config, params, connector_info, endpoint)
+    if params.get('incremental_sync'):
+        return get_incident_list_changes(config, params, connector_info, endpoint)
+    payload = incident_list_payload(params)
+    response = list_request(config, params, connector_info, endpoint, payload)
     return response
 
 
+def get_incident_list_by_time_windows(config, params, connector_info, endpoint):
+    if not params.get('created_datetime'):
+        raise ConnectorError('Created DateTime is required to retrieve incidents in parallel time windows')
+    start = parse_datetime(params.get('created_datetime'))
+    end_datetime = params.get('created_datetime_end')
+    end = parse_datetime(end_datetime) if end_datetime else datetime.now(timezone.utc)
+    if end <= start:
+        raise ConnectorError('End DateTime must be later than Created DateTime')
+    orderby = params.get('$orderby') or DEFAULT_INCIDENT_ORDERBY
+    window_params = dict(params, **{'$orderby': orderby, '$skipToken': None})
+    windows = split_time_range(start, end, int(params.get('time_windows') or DEFAULT_TIME_WINDOWS))
+
+    def fetch_window(window):
+        payload = incident_list_payload(window_params, created_from=window[0], created_to=window[1])
+        return list(iterate_items(config, connector_info, endpoint, payload))
+
+    window_results = run_concurrently(fetch_window, windows, params.get('max_workers'))
+    return {'value': list(merge_ordered(window_results, orderby))}
+
+
+def parse_workspaces(value):
+    workspaces = []
+    for workspace in parse_list(value):
+        if isinstance(workspace, str):
+            workspace = dict(zip(WORKSPACE_KEYS, workspace.strip('/').split('/')))
+        workspace = {key: workspace.get(key) for key in WORKSPACE_KEYS}
+        if not all(workspace.values()):
+            raise ConnectorError('Specify each workspace as subscription_id/resource_group/workspace_name or as an '
+                                 'object with the keys {0}'.format(', '.join(WORKSPACE_KEYS)))
+        workspaces.append(workspace)
+    if not workspaces:
+        raise ConnectorError('Specify at least one workspace')
+    return workspaces
+
+
+def get_incident_list_across_workspaces(config, params, connector_info, url):
+    # the workspaces are queried with the credentials of the configuration, so they must be accessible to its
+    # application; each workspace returns its incidents in the Order By order and the results are merged with a heap
+    workspaces = parse_workspaces(params.get('workspaces'))
+    orderby = params.get('$orderby') or DEFAULT_INCIDENT_ORDERBY
+    payload = incident_list_payload(dict(params, **{'$orderby': orderby, '$skipToken': None}))
+    max_items, max_pages = None, 1
+    if params.get('fetch_all_pages'):
+        max_items = int(params.get('max_items') or DEFAULT_MAX_ITEMS)
+        max_pages = int(params.get('max_pages') or 0) or None
+
+    def fetch_workspace(workspace):
+        endpoint = url.format(*(workspace[key] for key in WORKSPACE_KEYS))
+        incidents = []
+        try:
+            for page in iterate_pages(config, connector_info, endpoint, payload, max_pages=max_pages):
+                if page.get('message'):
+                    raise ConnectorError(page['message'])
+                incidents.extend(page.get('value', []))
+                if max_items and len(incidents) >= max_items:
+                    break
+        except Exception as err:
+            logger.exception('failed to retrieve the incidents of workspace {0}: {1}'.format(
+                workspace['WorkspaceName'], err))
+            return {'workspace': workspace, 'count': 0, 'error': str(err)}, []
+        for incident in incidents:
+            incident['workspace'] = workspace
+        return {'workspace': workspace, 'count': len(incidents)}, incidents
+
+    results = run_concurrently(fetch_workspace, workspaces,
+                               params.get('workspace_concurrency') or DEFAULT_WORKSPACE_CONCURRENCY)
+    summary = [result[0] for result in results]
+    if all(workspace.get('error') for workspace in summary):
+        raise ConnectorError('Failed to retrieve incidents from all workspaces: {0}'.format(
+            '; '.join('{0}: {1}'.format(workspace['workspace']['WorkspaceName'], workspace['error'])
+                      for workspace in summary)))
+    key, reverse = orderby_key(orderby)
+    merged = heapq.merge(*(result[1] for result in results), key=key, reverse=reverse)
+    return {'value': list(islice(merged, max_items)), 'workspaces': summary}
+
+
+_incident_sync_states = {}
+_incident_sync_lock = threading.Lock()
+
+
+def get_incident_sync_state(config):
+    path = workspace_data_path(config, 'incident-sync.db')
+    with _incident_sync_lock:
+        state = _incident_sync_states.get(path)
+        if not state:
+            state = _incident_sync_states[path] = IncidentSyncState(path)
+        return state
+
+
+def get_incident_list_changes(config, params, connector_info, endpoint):
+    sync_state = get_incident_sync_state(config)
+    sync_key = json_dumps([params.get('Status'), params.get('Severity'), params.get('$filter')])
+    with sync_state.locked():
+        saved_mark = sync_state.high_water_mark(sync_key)
+        # a Modified Since given by the caller takes precedence over the saved high-water mark; incidents already
+        # delivered are still skipped while their etag is unchanged
+        high_water_mark = params.get('modified_since') or saved_mark or params.get('created_datetime')
+        sync_params = dict(params, **{'created_datetime': None, '$orderby': INCIDENT_SYNC_ORDERBY})
+        payload = incident_list_payload(sync_params, modified_from=high_water_mark)
+        max_items = int(params.get('max_items') or DEFAULT_MAX_ITEMS)
+        incidents = list(iterate_items(config, connector_info, endpoint, payload, max_items=max_items))
+        delivered = sync_state.etags(sync_key, {incident.get('name') for incident in incidents})
+        changed, unchanged, seen = [], 0, {}
+        for incident in incidents:
+            name = incident.get('name')
+            modified = incident.get('properties', {}).get('lastModifiedTimeUtc')
+            if modified and (not high_water_mark or modified > high_water_mark):
+                high_water_mark = modified
+            if delivered.get(name) == incident.get('etag') or seen.get(name) == incident.get('etag'):
+                unchanged += 1
+                continue
+            seen[name] = incident.get('etag')
+            changed.append(incident)
+        if saved_mark and (not high_water_mark or saved_mark > high_water_mark):
+            high_water_mark = saved_mark
+        sync_cache_size = int(params.get('sync_cache_size') or DEFAULT_SYNC_CACHE_SIZE)
+        sync_state.save(sync_key, high_water_mark, seen, sync_cache_size)
+    return {'value': changed, 'unchanged': unchanged, 'high_water_mark': high_water_mark}
+
+
 def get_incident(config, params, connector_info):
     url = INCIDENT_API + "/{3}?api-version=2022-11-01"
     endpoint = create_endpoint(config, url, id=params.get('incidentId'))
-    response = api_request("GET", endpoint, connector_info, config, params={})
+    response = cached_request(endpoint, connector_info, config)
     return response
 
 
@@ -222,6 +1393,85 @@ def update_incident(config, params, connector_info):
     return response
 
 
+def incident_changes(params):
+    changes = {
+        'status': params.get('Status'),
+        'severity': params.get('Severity'),
+        'classification': params.get('classification'),
+        'classificationReason': params.get('reason'),
+        'classificationComment': params.get('Comment')
+    }
+    changes = {k: v for k, v in changes.items() if v is not None and v != ''}
+    changes.update(params.get('custom_attributes') or {})
+    if changes.get('status') == 'Closed' and not changes.get('classification'):
+        raise ConnectorError('A classification is required to close incidents')
+    return changes
+
+
+# applies the changes on top of the incident's current properties; on an etag conflict the incident is read again
+# and the changes are reapplied. Returns the updated incident, whether it changed, and the conflicts encountered
+def apply_incident_changes(config, connector_info, incident_id, changes, conflict_retries, incident=None):
+    endpoint = create_endpoint(config, INCIDENT_API + "/{3}?api-version=2022-11-01", id=incident_id)
+    client = get_client(config)
+    conflicts = 0
+    while True:
+        if incident is None:
+            incident = api_request("GET", endpoint, connector_info, config, params={})
+            if incident.get('message'):
+                return incident
+        current = incident.get('properties', {})
+        if all(current.get(key) == value for key, value in changes.items()):
+            return {'incident': incident, 'changed': False, 'conflicts': conflicts}
+        properties = {key: current[key] for key in INCIDENT_WRITABLE_PROPERTIES if current.get(key) is not None}
+        properties.update(changes)
+        with request_errors():
+            response = send_request(client, 'PUT', endpoint, connector_info, config,
+                                    json={'etag': incident.get('etag'), 'properties': properties})
+            if response.status_code in INCIDENT_CONFLICT_STATUS_CODES:
+                if conflicts >= conflict_retries:
+                    raise ConnectorError('The incident {0} was changed concurrently {1} times, giving up: {2}'.format(
+                        incident_id, conflicts + 1, response.content))
+                conflicts += 1
+                incident = None
+                continue
+            if response.status_code not in [200, 201]:
+                raise RequestError("{0}".format(response.content), response.status_code)
+            return {'incident': response.json(), 'changed': True, 'conflicts': conflicts}
+
+
+def bulk_update_incidents(config, params, connector_info):
+    changes = incident_changes(params)
+    if not changes:
+        raise ConnectorError('Specify at least one change to apply to the incidents')
+    # incidents resolved through a filter are updated from the listed state, saving a read per incident
+    incidents = OrderedDict((incident_id, None) for incident_id in parse_list(params.get('incident_ids')))
+    if params.get('$filter'):
+        listed = get_incident_list(config, {'$filter': params.get('$filter'), 'fetch_all_pages': True,
+                                            'max_items': params.get('max_items')}, connector_info)
+        for incident in listed.get('value', []):
+            incidents[incident.get('name')] = incident
+    if not incidents:
+        raise ConnectorError('Specify the incident IDs or a filter that matches the incidents to update')
+    conflict_retries = int(params.get('conflict_retries') if params.get('conflict_retries') is not None
+                           else DEFAULT_CONFLICT_RETRIES)
+
+    def update(incident_id):
+        return apply_incident_changes(config, connector_info, incident_id, changes, conflict_retries,
+                                      incident=incidents[incident_id])
+
+    result = run_bulk(update, list(incidents), params.get('max_workers'), retries=int(params.get('retries') or 0))
+    for outcome in result['results']:
+        if outcome['status'] == 'Success':
+            update_result = outcome['result']
+            outcome.update(result=update_result['incident'], conflicts=update_result['conflicts'],
+                           status='Success' if update_result['changed'] else 'Unchanged')
+    result['summary'].update(
+        succeeded=sum(1 for outcome in result['results'] if outcome['status'] == 'Success'),
+        unchanged=sum(1 for outcome in result['results'] if outcome['status'] == 'Unchanged'),
+        conflicts=sum(outcome.get('conflicts', 0) for outcome in result['results']))
+    return result
+
+
 def get_alert_list(config, params, connector_info):
     url = INCIDENT_API + "/{3}/alerts?api-version=2022-11-01"
     endpoint = create_endpoint(config, url, id=params.get('incidentId'))
@@ -243,6 +1493,32 @@ def get_bookmarks_list(config, params, connector_info):
     return response
 
 
+def fetch_incidents_for_ingestion(config, params, connector_info):
+    incidents = get_incident_list(config, params, connector_info)
+    if incidents.get('message'):
+        return incidents
+    expansions = []
+    if params.get('include_alerts', True):
+        expansions.append('alerts')
+    if params.get('include_entities', True):
+        expansions.append('entities')
+    tasks = [(incident, key) for incident in incidents.get('value', []) for key in expansions]
+
+    def expand(task):
+        incident, key = task
+        url = INCIDENT_API + "/{3}/" + key + "?api-version=2022-11-01"
+        return {'method': 'POST', 'endpoint': create_endpoint(config, url, id=incident.get('name')), 'json': {}}
+
+    # a failed expansion is recorded on its incident, so that the other incidents are still ingested
+    results = fan_out_requests(config, connector_info, tasks, expand, params.get('max_workers'), return_errors=True)
+    for (incident, key), result in zip(tasks, results):
+        if isinstance(result, ConnectorError):
+            incident[key + '_error'] = str(result)
+        else:
+            incident[key] = result
+    return incidents
+
+
 def create_incident_relations(config, params, connector_info):
     endpoint = create_endpoint(config, INCIDENT_RELATION_API,
                                id=params.get('incidentId')) + "/{0}?api-version=2022-11-01".format(
@@ -271,7 +1547,7 @@ def get_all_incident_relations(config, params, connector_info):
         '$skipToken': skip_token
     }
     payload = {k: v for k, v in payload.items() if v is not None and v != ''}
-    response = api_request("GET", endpoint, connector_info, config, params=payload)
+    response = list_request(config, params, connector_info, endpoint, payload)
     return response
 
 
@@ -336,7 +1612,7 @@ def get_all_incident_comments(config, params, connector_info):
         '$skipToken': skip_token
     }
     payload = {k: v for k, v in payload.items() if v is not None and v != ''}
-    response = api_request("GET", endpoint, connector_info, config, params=payload)
+    response = list_request(config, params, connector_info, endpoint, payload)
     return response
 
 
@@ -344,7 +1620,7 @@ def get_incident_comment(config, params, connector_info):
     endpoint = create_endpoint(config, INCIDENT_COMMENT_API,
                                id=params.get('incidentId')) + "/{0}?api-version=2022-11-01".format(
         params.get('incidentcommentId'))
-    response = api_request("GET", endpoint, connector_info, config, params={})
+    response = cached_request(endpoint, connector_info, config)
     return response
 
 
@@ -373,6 +1649,43 @@ def delete_incident_comment(config, params, connector_info):
             params.get("incidentcommentId"), params.get('incidentId'))}
 
 
+INCIDENT_BUNDLE_SECTIONS = OrderedDict([
+    ('incident', get_incident),
+    ('alerts', get_alert_list),
+    ('entities', get_entities_list),
+    ('bookmarks', get_bookmarks_list),
+    ('comments', get_all_incident_comments),
+    ('relations', get_all_incident_relations)
+])
+
+
+def get_incident_bundle(config, params, connector_info):
+    sections = [section.lower() for section in parse_list(params.get('sections'))] or list(INCIDENT_BUNDLE_SECTIONS)
+    unknown = [section for section in sections if section not in INCIDENT_BUNDLE_SECTIONS]
+    if unknown:
+        raise ConnectorError('Unknown incident bundle sections: {0}'.format(', '.join(unknown)))
+    # the list sections follow nextLink, up to max_items records each
+    section_params = {'incidentId': params.get('incidentId'), 'fetch_all_pages': True,
+                      'max_items': params.get('max_items')}
+
+    def fetch(section):
+        try:
+            return INCIDENT_BUNDLE_SECTIONS[section](config, dict(section_params), connector_info), None
+        except ConnectorError as err:
+            return None, str(err)
+
+    bundle, errors = {'incidentId': params.get('incidentId')}, {}
+    for section, (result, error) in zip(sections, run_concurrently(fetch, sections, len(sections))):
+        if error:
+            errors[section] = error
+        else:
+            bundle[section] = result
+    if bundle.get('incident', {}).get('message'):
+        return bundle['incident']
+    bundle['errors'] = errors
+    return bundle
+
+
 def create_watchlist(config, params, connector_info):
     url = WATCHLIST_API + "/{3}?api-version=2022-11-01"
     endpoint = create_endpoint(config, url, id=params.get('watchlistAlias'))
@@ -390,7 +1703,7 @@ def create_watchlist(config, params, connector_info):
     if custom_attributes:
         payload['properties'].update(custom_attributes)
     payload = check_payload(payload)
-    response = api_request("PUT", endpoint, connector_info, config, json=payload)
+    response = upload_watchlist(config, params, connector_info, endpoint, payload)
     return response
 
 
@@ -411,7 +1724,7 @@ def get_all_watchlist(config, params, connector_info):
 def get_watchlist(config, params, connector_info):
     url = WATCHLIST_API + "/{3}?api-version=2022-11-01"
     endpoint = create_endpoint(config, url, id=params.get('watchlistAlias'))
-    response = api_request("GET", endpoint, connector_info, config, params={})
+    response = cached_request(endpoint, connector_info, config)
     return response
 
 
@@ -432,10 +1745,89 @@ def update_watchlist(config, params, connector_info):
     if custom_attributes:
         payload['properties'].update(custom_attributes)
     payload = check_payload(payload)
+    response = upload_watchlist(config, params, connector_info, endpoint, payload)
+    return response
+
+
+def csv_line(row):
+    buffer = StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(row)
+    return buffer.getvalue()
+
+
+def chunk_csv_rows(header, rows, max_bytes):
+    header_line = csv_line(header)
+    lines, size = [], len(header_line.encode())
+    for row in rows:
+        line = csv_line(row)
+        if lines and size + len(line.encode()) > max_bytes:
+            yield header_line + ''.join(lines)
+            lines, size = [], len(header_line.encode())
+        lines.append(line)
+        size += len(line.encode())
+    if lines:
+        yield header_line + ''.join(lines)
+
+
+def records_to_rows(records):
+    header = list(OrderedDict((key, None) for record in records for key in record))
+    rows = ([record.get(key, '') for key in header] for record in records)
+    return header, rows
+
+
+def download_attachment(file_iri):
+    file_iri = str(file_iri)
+    if file_iri.startswith('/api/3/attachments/'):
+        file_iri = make_request(file_iri, 'GET')['file']['@id']
+    elif not file_iri.startswith('/api/3/files/'):
+        file_iri = '/api/3/files/{0}'.format(file_iri)
+    return os.path.join('/tmp', download_file_from_cyops(file_iri)['cyops_file_path'])
+
+
+def watchlist_content_chunks(params):
+    max_bytes = int(params.get('chunk_size') or WATCHLIST_RAW_CONTENT_LIMIT)
+    content = params.get('content_source')
+    if content == 'Records':
+        header, rows = records_to_rows(parse_list(params.get('records')))
+        yield from chunk_csv_rows(header, rows, max_bytes)
+    elif content == 'Attachment':
+        with open(download_attachment(params.get('file_iri')), newline='', encoding='utf-8-sig') as csv_file:
+            reader = csv.reader(csv_file)
+            for _ in range(int(params.get('numberOfLinesToSkip') or 0)):
+                next(reader, None)
+            header = next(reader, None)
+            if header:
+                yield from chunk_csv_rows(header, reader, max_bytes)
+
+
+def upload_watchlist(config, params, connector_info, endpoint, payload):
+    chunks = watchlist_content_chunks(params)
+    first_chunk = next(chunks, None)
+    if first_chunk:
+        payload.setdefault('properties', {}).update({'contentType': 'text/csv', 'rawContent': first_chunk})
     response = api_request("PUT", endpoint, connector_info, config, json=payload)
+    if first_chunk and not response.get('message'):
+        summary = upload_watchlist_chunks(config, params, connector_info, chunks)
+        if summary['total']:
+            response['additionalItems'] = summary
     return response
 
 
+def upload_watchlist_chunks(config, params, connector_info, chunks):
+    summary = {'total': 0, 'succeeded': 0, 'failed': 0, 'errors': []}
+    for chunk in chunks:
+        bulk_params = {
+            'watchlistAlias': params.get('watchlistAlias'),
+            'items': list(csv.DictReader(StringIO(chunk))),
+            'max_workers': params.get('max_workers')
+        }
+        bulk = bulk_upsert_watchlist_items(config, bulk_params, connector_info)
+        for key in ('total', 'succeeded', 'failed'):
+            summary[key] += bulk['summary'][key]
+        summary['errors'].extend(result for result in bulk['results'] if result['status'] == 'Failed')
+    return summary
+
+
 def delete_watchlist(config, params, connector_info):
     url = WATCHLIST_API + "/{3}?api-version=2022-11-01"
     endpoint = create_endpoint(config, url, id=params.get('watchlistAlias'))
@@ -447,10 +1839,12 @@ def delete_watchlist(config, params, connector_info):
             params.get("watchlistAlias"))}
 
 
-def create_watchlist_item(config, params, connector_info):
-    endpoint = create_endpoint(config, WATCHLIST_ITEM_API,
-                               id=params.get('watchlistAlias')) + "/{0}?api-version=2022-11-01".format(
-        uuid.uuid4())
+def watchlist_item_endpoint(config, watchlist_alias, watchlist_item_id):
+    return create_endpoint(config, WATCHLIST_ITEM_API, id=watchlist_alias) + "/{0}?api-version=2022-11-01".format(
+        watchlist_item_id)
+
+
+def watchlist_item_request(config, params, watchlist_item_id):
     payload = {
         'etag': params.get('etag'),
         'properties': {
@@ -460,8 +1854,13 @@ def create_watchlist_item(config, params, connector_info):
     custom_attributes = params.get('custom_attributes')
     if custom_attributes:
         payload['properties'].update(custom_attributes)
-    payload = check_payload(payload)
-    response = api_request("PUT", endpoint, connector_info, config, json=payload)
+    return {'method': 'PUT', 'json': check_payload(payload),
+            'endpoint': watchlist_item_endpoint(config, params.get('watchlistAlias'), watchlist_item_id)}
+
+
+def create_watchlist_item(config, params, connector_info):
+    request = watchlist_item_request(config, params, uuid.uuid4())
+    response = api_request("PUT", request['endpoint'], connector_info, config, json=request['json'])
     return response
 
 
@@ -475,7 +1874,7 @@ def get_all_watchlist_items(config, params, connector_info):
         '$skipToken': skip_token
     }
     payload = {k: v for k, v in payload.items() if v is not None and v != ''}
-    response = api_request("GET", endpoint, connector_info, config, params=payload)
+    response = list_request(config, params, connector_info, endpoint, payload)
     return response
 
 
@@ -488,20 +1887,8 @@ def get_watchlist_item(config, params, connector_info):
 
 
 def update_watchlist_item(config, params, connector_info):
-    endpoint = create_endpoint(config, WATCHLIST_ITEM_API,
-                               id=params.get('watchlistAlias')) + "/{0}?api-version=2022-11-01".format(
-        params.get('watchlistItemId'))
-    payload = {
-        'etag': params.get('etag'),
-        'properties': {
-            'itemsKeyValue': params.get('itemsKeyValue')
-        }
-    }
-    custom_attributes = params.get('custom_attributes')
-    if custom_attributes:
-        payload['properties'].update(custom_attributes)
-    payload = check_payload(payload)
-    response = api_request("PUT", endpoint, connector_info, config, json=payload)
+    request = watchlist_item_request(config, params, params.get('watchlistItemId'))
+    response = api_request("PUT", request['endpoint'], connector_info, config, json=request['json'])
     return response
 
 
@@ -517,16 +1904,264 @@ def delete_watchlist_item(config, params, connector_info):
             params.get("watchlistItemId"))}
 
 
+def bulk_upsert_watchlist_items(config, params, connector_info):
+    watchlist_alias = params.get('watchlistAlias')
+
+    def upsert(record):
+        if isinstance(record, dict) and 'itemsKeyValue' in record:
+            item_params = dict(record, watchlistAlias=watchlist_alias)
+        else:
+            item_params = {'watchlistAlias': watchlist_alias, 'itemsKeyValue': record}
+        return watchlist_item_request(config, item_params, item_params.get('watchlistItemId') or uuid.uuid4())
+
+    records = parse_list(params.get('items'))
+    return run_bulk_requests(config, connector_info, records, upsert, params.get('max_workers'))
+
+
+def bulk_delete_watchlist_items(config, params, connector_info):
+    watchlist_alias = params.get('watchlistAlias')
+
+    def delete(item_id):
+        return {'method': 'DELETE', 'endpoint': watchlist_item_endpoint(config, watchlist_alias, item_id), 'json': {}}
+
+    item_ids = parse_list(params.get('watchlistItemIds'))
+    result = run_bulk_requests(config, connector_info, item_ids, delete, params.get('max_workers'))
+    for outcome in result['results']:
+        if outcome['status'] == 'Success':
+            outcome['result'] = {"result": "Successfully deleted the watchlist item {0}".format(outcome['item'])}
+    return result
+
+
+def item_digest(items_key_value):
+    normalized = {str(key): str(value) for key, value in items_key_value.items() if value is not None and value != ''}
+    return sha1(json_dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+def sync_watchlist(config, params, connector_info):
+    watchlist_alias = params.get('watchlistAlias')
+    search_key = params.get('itemsSearchKey')
+    if not search_key:
+        watchlist = get_watchlist(config, {'watchlistAlias': watchlist_alias}, connector_info)
+        if watchlist.get('message'):
+            return watchlist
+        search_key = watchlist.get('properties', {}).get('itemsSearchKey')
+    desired = OrderedDict()
+    for record in parse_list(params.get('records')):
+        if not isinstance(record, dict):
+            raise ConnectorError('Each record must be an object: {0}'.format(record))
+        if record.get(search_key) in (None, ''):
+            raise ConnectorError('Record {0} has no value for the search key {1}'.format(record, search_key))
+        desired[str(record[search_key])] = record
+
+    url = WATCHLIST_ITEM_API + "?api-version=2022-11-01"
+    endpoint = create_endpoint(config, url, id=watchlist_alias)
+    index, duplicates = {}, []
+    for item in iterate_items(config, connector_info, endpoint, {}):
+        properties = item.get('properties', {})
+        if properties.get('isDeleted'):
+            continue
+        items_key_value = properties.get('itemsKeyValue') or {}
+        key = str(items_key_value.get(search_key))
+        if key in index:
+            duplicates.append(item.get('name'))
+        else:
+            index[key] = (item.get('name'), item_digest(items_key_value))
+
+    actions, unchanged = [], 0
+    for key, record in desired.items():
+        existing = index.pop(key, None)
+        if not existing:
+            # the id of a new item is chosen here, so that a retried request updates the item instead of adding
+            # another one
+            actions.append(('added', str(uuid.uuid4()), record))
+        elif existing[1] != item_digest(record):
+            actions.append(('updated', existing[0], record))
+        else:
+            unchanged += 1
+    if params.get('delete_missing', True):
+        actions.extend(('deleted', item_id, None) for item_id, digest in index.values())
+        actions.extend(('deleted', item_id, None) for item_id in duplicates)
+
+    def apply(action):
+        change, item_id, record = action
+        if change == 'deleted':
+            return {'method': 'DELETE', 'endpoint': watchlist_item_endpoint(config, watchlist_alias, item_id),
+                    'json': {}}
+        item_params = {'watchlistAlias': watchlist_alias, 'itemsKeyValue': record}
+        return watchlist_item_request(config, item_params, item_id)
+
+    bulk = run_bulk_requests(config, connector_info, actions, apply, params.get('max_workers'),
+                             retries=int(params.get('retries') or 0))
+    result = {'added': 0, 'updated': 0, 'deleted': 0, 'unchanged': unchanged, 'failed': 0, 'errors': []}
+    for outcome in bulk['results']:
+        if outcome['status'] == 'Success':
+            result[outcome['item'][0]] += 1
+        else:
+            result['failed'] += 1
+            result['errors'].append({'action': outcome['item'][0], 'watchlistItemId': outcome['item'][1],
+                                     'itemsKeyValue': outcome['item'][2], 'error': outcome['error']})
+    result['elapsed_seconds'] = bulk['summary']['elapsed_seconds']
+    return result
+
+
+def query_result_too_large(response, table):
+    return len(table.get('rows', [])) >= QUERY_ROW_LIMIT or \
+        'E_QUERY_RESULT_SET_TOO_LARGE' in json_dumps(response.get('error') or {})
+
+
+# runs the query over [start, end) and returns its result tables; with split, the time range is halved while the
+# result exceeds the service's limits, otherwise the result is returned as truncated
+def query_slice(config, connector_info, endpoint, query, start, end, split=False):
+    payload = {'query': query, 'timespan': '{0}/{1}'.format(format_datetime(start), format_datetime(end))}
+    response = api_request("POST", endpoint, connector_info, config, json=payload)
+    if response.get('message'):
+        raise ConnectorError('Log Analytics query failed: {0}'.format(response.get('message')))
+    tables = response.get('tables') or [{}]
+    table = next((table for table in tables if table.get('name') == 'PrimaryResult'), tables[0])
+    if query_result_too_large(response, table):
+        if split and (end - start).total_seconds() > QUERY_MIN_SLICE_SECONDS:
+            middle = start + (end - start) / 2
+            logger.info('Query result for {0} is too large, splitting the time range'.format(payload['timespan']))
+            return query_slice(config, connector_info, endpoint, query, start, middle, split) + \
+                query_slice(config, connector_info, endpoint, query, middle, end, split)
+        logger.warning('Query result for {0} exceeds the service limits and is truncated'.format(payload['timespan']))
+        table['truncated'] = True
+    return [table]
+
+
+def append_columns(result, table):
+    names = [column.get('name') for column in table.get('columns', [])]
+    for column in table.get('columns', []):
+        if column.get('name') not in result['data']:
+            result['columns'].append({'name': column.get('name'), 'type': column.get('type')})
+            result['data'][column.get('name')] = [None] * result['row_count']
+    targets = [result['data'][name] for name in names]
+    missing = [values for name, values in result['data'].items() if name not in names]
+    for row in table.get('rows', []):
+        for values, value in zip(targets, row):
+            values.append(value)
+        for values in missing:
+            values.append(None)
+    result['row_count'] += len(table.get('rows', []))
+    result['truncated'] = result['truncated'] or bool(table.get('truncated'))
+
+
+def run_kql_query(config, params, connector_info):
+    end = parse_datetime(params.get('end_time')) if params.get('end_time') else datetime.now(timezone.utc)
+    start = parse_datetime(params.get('start_time')) if params.get('start_time') else end - timedelta(days=1)
+    if start >= end:
+        raise ConnectorError('Start Time must be earlier than End Time')
+    # the query runs over the whole time range unless slicing is requested, since the results of separate slices
+    # are appended and only add up to the result of the whole range for queries that return rows, not aggregates
+    slice_hours = float(params.get('slice_hours') or 0)
+    slices = max(int(ceil((end - start).total_seconds() / (slice_hours * 3600))), 1) if slice_hours > 0 else 1
+    step = (end - start) / slices
+    windows = [(start + step * index, start + step * (index + 1)) for index in range(slices)]
+    endpoint = create_endpoint(config, LOG_ANALYTICS_QUERY_API)
+    started = time()
+
+    def run(window):
+        return query_slice(config, connector_info, endpoint, params.get('query'), window[0], window[1],
+                           split=slice_hours > 0)
+
+    # slices are merged in time order as they arrive; each slice's row data is released once appended
+    result = {'columns': [], 'data': {}, 'row_count': 0, 'slices': 0, 'truncated': False}
+    for tables in iter_concurrently(run, windows, params.get('max_workers')):
+        for table in tables:
+            append_columns(result, table)
+            result['slices'] += 1
+    result['timespan'] = '{0}/{1}'.format(format_datetime(start), format_datetime(end))
+    result['elapsed_seconds'] = round(time() - started, 3)
+    return result
+
+
+def batch_operation_spec(config, request):
+    method = str(request.get('method') or 'GET').upper()
+    path = str(request.get('path') or '').strip('/')
+    if method not in BATCH_METHODS or path.split('/')[0] not in BATCH_RESOURCES:
+        raise ConnectorError('Unsupported batch request: {0} {1}'.format(method, path))
+    endpoint = create_endpoint(config, SECURITY_INSIGHTS_API) + '/' + path
+    if 'api-version=' not in path:
+        endpoint += ('&' if '?' in path else '?') + 'api-version=2022-11-01'
+    return {'method': method, 'endpoint': endpoint, 'json': request.get('body')}
+
+
+def execute_batch(config, params, connector_info):
+    batch = parse_list(params.get('requests'))
+    specs = [batch_operation_spec(config, request) for request in batch]
+    start = time()
+    results = []
+    for index, (spec, sub) in enumerate(zip(specs, batch_requests(config, connector_info, specs,
+                                                                  params.get('max_workers')))):
+        result = {'index': index, 'method': spec['method'], 'path': batch[index].get('path'),
+                  'status_code': sub.get('httpStatusCode')}
+        if result['status_code'] in [200, 201, 202, 204]:
+            result.update(status='Success', result=batch_result(sub))
+        else:
+            result.update(status='Failed', error=sub.get('content') or sub.get('error'))
+        results.append(result)
+    succeeded = sum(1 for result in results if result['status'] == 'Success')
+    return {
+        'results': results,
+        'summary': {
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'batches': ceil(len(results) / float(BATCH_SIZE)),
+            'elapsed_seconds': round(time() - start, 3)
+        }
+    }
+
+
+def get_connector_metrics(config, params, connector_info):
+    if params.get('output_format') == 'Prometheus':
+        result = {'content_type': 'text/plain; version=0.0.4', 'metrics': metrics.prometheus()}
+    else:
+        result = metrics.snapshot()
+    if params.get('reset'):
+        metrics.reset()
+    return result
+
+
+_health_checks = {}
+
+
 def _check_health(config, connector_info):
+    ttl = int(config.get('health_check_ttl') if config.get('health_check_ttl') is not None
+              else DEFAULT_HEALTH_CHECK_TTL)
+    key = (config.get('config_id'), client_fingerprint(config))
+    cached = _health_checks.get(key)
+    if cached and monotonic() - cached['checked'] < ttl:
+        return dict(cached['result'], cached=True)
     try:
-        if check(config, connector_info):
-            incidents = get_incident_list(config, params={}, connector_info=connector_info)
-            if not incidents.get('message'):
-                return True
-            else:
-                raise ConnectorError("Invalid Credentials")
+        with metrics.operation('check_health') as record:
+            started = perf_counter()
+            check(config, connector_info)
+            token_validation = perf_counter() - started
+            # a single incident is enough to prove that the workspace is reachable and the token is accepted
+            started = perf_counter()
+            incidents = api_request("GET", create_endpoint(config, INCIDENT_API + "?api-version=2022-11-01"),
+                                    connector_info, config, params={'$top': 1})
+            api_latency = perf_counter() - started
+        if incidents.get('message'):
+            raise ConnectorError("Invalid Credentials")
     except Exception as err:
+        _health_checks.pop(key, None)
         raise ConnectorError(str(err))
+    # the token endpoint is only called when the token had to be generated or refreshed; otherwise validation is a
+    # lookup of the cached token and no token endpoint latency is reported
+    token_endpoint = record.get('token_refresh_seconds')
+    result = {'token_validation_ms': round(token_validation * 1000, 1),
+              'token_endpoint_ms': round(token_endpoint * 1000, 1) if token_endpoint is not None else None,
+              'api_latency_ms': round(api_latency * 1000, 1)}
+    for dependency, latency in (('token endpoint', token_endpoint), ('Microsoft Sentinel API', api_latency)):
+        if latency is not None and latency > HEALTH_CHECK_SLOW_SECONDS:
+            logger.warning('Health check: the {0} took {1:.2f} seconds to respond'.format(dependency, latency))
+    logger.info('Health check latencies: token validation {token_validation_ms} ms, token endpoint '
+                '{token_endpoint_ms} ms, API {api_latency_ms} ms'.format(**result))
+    if ttl > 0:
+        _health_checks[key] = {'checked': monotonic(), 'result': result}
+    return dict(result, cached=False)
 
 
 operations = {
@@ -536,11 +2171,16 @@ operations = {
     'get_incident': get_incident,
     'update_threat_intelligence_indicator': update_threat_intelligence_indicator,
     'update_incident': update_incident,
+    'bulk_update_incidents': bulk_update_incidents,
     'delete_threat_intelligence_indicator': delete_threat_intelligence_indicator,
+    'bulk_create_threat_intelligence_indicators': bulk_create_threat_intelligence_indicators,
+    'bulk_delete_threat_intelligence_indicators': bulk_delete_threat_intelligence_indicators,
+    'lookup_indicators': lookup_indicators,
     'get_incident_list': get_incident_list,
     'get_alert_list': get_alert_list,
     'get_entities_list': get_entities_list,
     'get_bookmarks_list': get_bookmarks_list,
+    'fetch_incidents_for_ingestion': fetch_incidents_for_ingestion,
     'create_incident_relations': create_incident_relations,
     'get_all_incident_relations': get_all_incident_relations,
     'get_incident_relations': get_incident_relations,
@@ -551,6 +2191,7 @@ operations = {
     'get_incident_comment': get_incident_comment,
     'update_incident_comment': update_incident_comment,
     'delete_incident_comment': delete_incident_comment,
+    'get_incident_bundle': get_incident_bundle,
     'create_watchlist': create_watchlist,
     'get_all_watchlist': get_all_watchlist,
     'get_watchlist': get_watchlist,
@@ -560,5 +2201,11 @@ operations = {
     'get_all_watchlist_items': get_all_watchlist_items,
     'get_watchlist_item': get_watchlist_item,
     'update_watchlist_item': update_watchlist_item,
-    'delete_watchlist_item': delete_watchlist_item
+    'delete_watchlist_item': delete_watchlist_item,
+    'bulk_upsert_watchlist_items': bulk_upsert_watchlist_items,
+    'bulk_delete_watchlist_items': bulk_delete_watchlist_items,
+    'sync_watchlist': sync_watchlist,
+    'run_kql_query': run_kql_query,
+    'execute_batch': execute_batch,
+    'get_connector_metrics': get_connector_metrics
 }
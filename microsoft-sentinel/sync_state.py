@@ -0,0 +1,61 @@
+""" Copyright start
+  Copyright (C) 2008 - 2023 Fortinet Inc.
+  All rights reserved.
+  FORTINET CONFIDENTIAL & FORTINET PROPRIETARY SOURCE CODE
+  Copyright end """
+
+import fcntl
+import os
+from contextlib import contextmanager
+from .local_store import LOOKUP_BATCH_SIZE, SQLiteStore
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS syncs (sync_key TEXT PRIMARY KEY, high_water_mark TEXT)",
+    "CREATE TABLE IF NOT EXISTS etags (sync_key TEXT, name TEXT, etag TEXT, PRIMARY KEY (sync_key, name))"
+]
+
+
+class IncidentSyncState(SQLiteStore):
+    # the high-water mark and the etags of the incidents delivered by each incremental sync, shared by all the
+    # worker processes of the connector so that a sync continues where the previous one stopped
+    schema = SCHEMA
+
+    @contextmanager
+    def locked(self):
+        # syncs are run one at a time across processes and threads; each caller opens its own descriptor, so the
+        # lock also excludes other threads of the same process
+        descriptor = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(descriptor)
+
+    def high_water_mark(self, sync_key):
+        with self.transaction() as connection:
+            row = connection.execute('SELECT high_water_mark FROM syncs WHERE sync_key = ?', (sync_key,)).fetchone()
+        return row[0] if row else None
+
+    def etags(self, sync_key, names):
+        etags = {}
+        names = list(names)
+        with self.transaction() as connection:
+            for start in range(0, len(names), LOOKUP_BATCH_SIZE):
+                batch = names[start:start + LOOKUP_BATCH_SIZE]
+                query = 'SELECT name, etag FROM etags WHERE sync_key = ? AND name IN ({0})'.format(
+                    ', '.join('?' * len(batch)))
+                etags.update(connection.execute(query, [sync_key] + batch))
+        return etags
+
+    def save(self, sync_key, high_water_mark, etags, max_etags):
+        # etags are inserted again so their rowid orders them by the last sync that delivered them, and the
+        # least recently delivered ones are dropped beyond max_etags
+        with self.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO syncs (sync_key, high_water_mark) VALUES (?, ?)',
+                               (sync_key, high_water_mark))
+            connection.executemany('DELETE FROM etags WHERE sync_key = ? AND name = ?',
+                                   [(sync_key, name) for name in etags])
+            connection.executemany('INSERT INTO etags (sync_key, name, etag) VALUES (?, ?, ?)',
+                                   [(sync_key, name, etag) for name, etag in etags.items()])
+            connection.execute('DELETE FROM etags WHERE sync_key = ? AND rowid NOT IN (SELECT rowid FROM etags '
+                               'WHERE sync_key = ? ORDER BY rowid DESC LIMIT ?)', (sync_key, sync_key, max_etags))
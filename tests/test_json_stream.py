@@ -0,0 +1,74 @@
+""" Copyright start
+  Copyright (C) 2008 - 2023 Fortinet Inc.
+  All rights reserved.
+  FORTINET CONFIDENTIAL & FORTINET PROPRIETARY SOURCE CODE
+  Copyright end """
+
+import importlib.util
+import json
+import os
+import random
+import unittest
+
+MODULE_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'microsoft-sentinel', 'json_stream.py')
+spec = importlib.util.spec_from_file_location('json_stream', MODULE_PATH)
+json_stream = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(json_stream)
+
+DOCUMENT = {
+    'value': [
+        {'name': 'incident-1', 'properties': {'incidentNumber': 12, 'score': 12.5, 'ratio': -0.25e-3, 'big': 1e5,
+                                              'title': 'Café ☃ "quoted" \\ slash', 'labels': [],
+                                              'active': True, 'closed': False, 'owner': None}},
+        12.5, 1e5, -7, 0, 3.25E+10, 'text', True, False, None, [1, [2.5, {'a': -1e-2}]], {}
+    ],
+    'count': 123456,
+    'nextLink': 'https://management.azure.com/incidents?$skipToken=10'
+}
+
+
+def members(chunks):
+    result = {}
+    for key, value in json_stream.iter_members(chunks):
+        if key == 'value':
+            result.setdefault('value', []).append(value)
+        else:
+            result[key] = value
+    return result
+
+
+def split(data, rng):
+    chunks, start = [], 0
+    while start < len(data):
+        end = start + rng.randint(1, 8)
+        chunks.append(data[start:end])
+        start = end
+    return chunks
+
+
+class JsonStreamTest(unittest.TestCase):
+
+    def test_random_chunk_splits(self):
+        data = json.dumps(DOCUMENT, ensure_ascii=False).encode()
+        rng = random.Random(7)
+        for _ in range(500):
+            self.assertEqual(members(split(data, rng)), DOCUMENT)
+
+    def test_every_single_split(self):
+        data = json.dumps(DOCUMENT, ensure_ascii=False).encode()
+        for index in range(1, len(data)):
+            self.assertEqual(members([data[:index], data[index:]]), DOCUMENT)
+
+    def test_numbers_split_inside_fraction_and_exponent(self):
+        self.assertEqual(members([b'{"value":[12.', b'5]}']), {'value': [12.5]})
+        self.assertEqual(members([b'{"value":[1e', b'5]}']), {'value': [1e5]})
+        self.assertEqual(members([b'{"value":[1e-', b'2]}']), {'value': [1e-2]})
+        self.assertEqual(members([b'{"count":1', b'2}']), {'count': 12})
+
+    def test_truncated_document_raises(self):
+        with self.assertRaises(json.JSONDecodeError):
+            members([b'{"value":[12.'])
+
+
+if __name__ == '__main__':
+    unittest.main()